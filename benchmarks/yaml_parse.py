@@ -0,0 +1,61 @@
+"""Compare pure-Python and libyaml parsing of a large subscription.
+
+Usage: python benchmarks/yaml_parse.py [NODES]
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+import yaml
+
+from clash_sub_manager.yaml_utils import HAS_LIBYAML, SafeLoader
+
+
+def build_subscription(nodes: int) -> str:
+    lines = ["mixed-port: 7890", "proxies:"]
+    for index in range(nodes):
+        lines.extend(
+            [
+                f"  - name: '🇭🇰 香港 {index:05d}'",
+                "    type: ss",
+                f"    server: hk{index}.example.com",
+                f"    port: {10000 + index % 50000}",
+                "    cipher: aes-128-gcm",
+                f"    password: secret-{index}",
+                "    udp: true",
+            ]
+        )
+    lines.append("proxy-groups:")
+    lines.append("  - {name: PROXY, type: select, proxies: ['🇭🇰 香港 00000']}")
+    return "\n".join(lines) + "\n"
+
+
+def timed(loader, text: str) -> float:
+    started = time.perf_counter()
+    data = yaml.load(text, Loader=loader)
+    elapsed = time.perf_counter() - started
+    assert len(data["proxies"]) > 0
+    return elapsed
+
+
+def main() -> int:
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    text = build_subscription(nodes)
+    print(f"nodes={nodes} size={len(text.encode()) / 1024:.0f} KB")
+
+    python_time = timed(yaml.SafeLoader, text)
+    print(f"yaml.SafeLoader   {python_time:.3f}s")
+
+    if not HAS_LIBYAML:
+        print("libyaml bindings unavailable; skipping CSafeLoader")
+        return 0
+
+    c_time = timed(SafeLoader, text)
+    print(f"yaml.CSafeLoader  {c_time:.3f}s  ({python_time / c_time:.1f}x faster)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
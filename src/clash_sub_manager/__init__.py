@@ -4,7 +4,9 @@ from __future__ import annotations
 
 from importlib import metadata
 
-from .proxy_selector import ClashProxySelector
+from .models import ProxyCatalog, ProxyGroup, ProxyNode
+from .proxy_selector import ClashAPIError, ClashProxySelector
+from .snapshot import ProxySnapshot
 from .subscription_manager import ClashSubscriptionManager
 
 try:
@@ -15,4 +17,9 @@ except metadata.PackageNotFoundError:  # pragma: no cover - dev installs
 __all__ = [
     "ClashSubscriptionManager",
     "ClashProxySelector",
+    "ClashAPIError",
+    "ProxySnapshot",
+    "ProxyCatalog",
+    "ProxyGroup",
+    "ProxyNode",
 ]
@@ -0,0 +1,157 @@
+"""Keep a selector group on its best node, with hysteresis against flapping."""
+
+from __future__ import annotations
+
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .console import Colors
+from .latency import LatencyStore, NodeStats
+from .proxy_selector import ClashAPIError, ClashProxySelector, human_delay
+
+DEFAULT_INTERVAL = 30
+DEFAULT_MARGIN = 50
+DEFAULT_SUSTAIN = 3
+DEFAULT_DWELL = 300
+DEFAULT_BATCH = 8
+DEFAULT_TIMEOUT = 3000
+
+
+class AutoSelector:
+    """Periodically probe a group and switch when a challenger stays ahead.
+
+    Each round probes the current node plus the next ``batch`` candidates
+    in rotation, plus the standing challenger, so probe load stays constant
+    regardless of group size. A challenger must beat the current node's
+    EWMA score by ``margin`` ms in ``sustain`` consecutive rounds in which
+    it was actually measured, and at least ``dwell`` seconds must have
+    passed since the last switch.
+    """
+
+    def __init__(
+        self,
+        selector: ClashProxySelector,
+        group: str,
+        interval: float = DEFAULT_INTERVAL,
+        margin: float = DEFAULT_MARGIN,
+        sustain: int = DEFAULT_SUSTAIN,
+        dwell: float = DEFAULT_DWELL,
+        batch: int = DEFAULT_BATCH,
+        timeout: int = DEFAULT_TIMEOUT,
+        test_url: Optional[str] = None,
+    ):
+        if selector.latency is None:
+            raise ValueError("自动选择需要启用延迟历史记录")
+        self.selector = selector
+        self.latency: LatencyStore = selector.latency
+        self.group = group
+        self.interval = interval
+        self.margin = margin
+        self.sustain = max(1, sustain)
+        self.dwell = dwell
+        self.batch = max(1, batch)
+        self.timeout = timeout
+        self.test_url = test_url
+
+        self._cursor = 0
+        self._challenger: Optional[str] = None
+        self._streak = 0
+        self._last_switch = float("-inf")
+
+    def _group_state(self) -> tuple[str, List[str]]:
+        snap = self.selector.snapshot()
+        group = snap.groups.get(self.group)
+        if group is None:
+            raise ValueError(f"策略组不存在: {self.group}")
+        if group.type != "Selector":
+            raise ValueError(f"策略组 {self.group} 的类型为 {group.type}，只有 Selector 组可以手动切换")
+        return group.now, group.choices()
+
+    def _next_batch(self, current: str, members: List[str]) -> List[str]:
+        candidates = [name for name in members if name != current]
+        if not candidates:
+            return []
+        size = min(self.batch, len(candidates))
+        start = self._cursor % len(candidates)
+        self._cursor = start + size
+        return [candidates[(start + offset) % len(candidates)] for offset in range(size)]
+
+    def step(self) -> Optional[str]:
+        """Run one probe round; returns the node switched to, if any."""
+        current, members = self._group_state()
+        probe = ([current] if current else []) + self._next_batch(current, members)
+        if self._challenger in members and self._challenger not in probe:
+            probe.append(self._challenger)
+        results = self.selector.measure_delays(
+            probe, concurrency=len(probe), timeout=self.timeout, url=self.test_url
+        )
+        self.selector.record_delays(results)
+
+        ranked: Dict[str, NodeStats] = {stats.name: stats for stats in self.latency.ranked(members)}
+        current_stats = ranked.get(current)
+        best = next((stats for stats in ranked.values() if stats.name != current), None)
+
+        now = time.monotonic()
+        line = f"[{datetime.now().strftime('%H:%M:%S')}] 当前 {current} {human_delay(results.get(current) or 0)}"
+        if current_stats is not None:
+            line += f" (EWMA {current_stats.score:.0f}ms)"
+
+        current_score = current_stats.score if current_stats is not None else float("inf")
+        if best is None or best.score + self.margin >= current_score:
+            self._challenger, self._streak = None, 0
+            print(line)
+            return None
+
+        # Only a fresh measurement counts towards the streak; a stored
+        # score alone must not carry a challenger over the line.
+        measured = bool(results.get(best.name))
+        if best.name != self._challenger:
+            self._challenger, self._streak = best.name, 0
+        if measured:
+            self._streak += 1
+        line += f" | 候选 {best.name} (EWMA {best.score:.0f}ms, {self._streak}/{self.sustain})"
+        if not measured:
+            line += " 本轮未测得"
+
+        if self._streak < self.sustain:
+            print(line)
+            return None
+
+        remaining = self.dwell - (now - self._last_switch)
+        if remaining > 0:
+            print(f"{line} | 驻留中，{remaining:.0f}s 后允许切换")
+            return None
+
+        print(line)
+        if not self.selector.switch_proxy(self.group, best.name):
+            return None
+        self._last_switch = now
+        self._challenger, self._streak = None, 0
+        return best.name
+
+    def run(self, rounds: Optional[int] = None) -> None:
+        """Loop until interrupted (or for ``rounds`` rounds)."""
+        print(f"\n{Colors.CYAN}{'='*70}{Colors.NC}")
+        print(f"{Colors.CYAN}自动选择: {self.group}{Colors.NC}")
+        print(
+            f"{Colors.CYAN}间隔 {self.interval}s · 阈值 {self.margin}ms · 连续 {self.sustain} 轮 · "
+            f"最短驻留 {self.dwell}s · 每轮 {self.batch} 个候选{Colors.NC}"
+        )
+        print(f"{Colors.CYAN}{'='*70}{Colors.NC}\n")
+
+        completed = 0
+        while rounds is None or completed < rounds:
+            started = time.monotonic()
+            try:
+                self.step()
+            except ClashAPIError as exc:
+                # Controller restarts are transient; keep looping.
+                print(f"{Colors.RED}✗ 无法连接到 Clash API: {exc}{Colors.NC}")
+            except ValueError as exc:
+                print(f"{Colors.RED}✗ {exc}{Colors.NC}")
+                return
+            completed += 1
+            if rounds is not None and completed >= rounds:
+                break
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
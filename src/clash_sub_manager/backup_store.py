@@ -0,0 +1,259 @@
+"""Content-addressed, compressed snapshot store for subscription backups."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:  # POSIX only; elsewhere the store is guarded per process
+    import fcntl
+except ImportError:  # pragma: no cover - depends on platform
+    fcntl = None
+
+try:  # optional: zstd compresses YAML noticeably better and faster
+    import zstandard
+except ImportError:  # pragma: no cover - depends on environment
+    zstandard = None
+
+CODEC_ZSTD = "zstd"
+CODEC_GZIP = "gzip"
+CODEC_SUFFIXES = {CODEC_ZSTD: ".yaml.zst", CODEC_GZIP: ".yaml.gz"}
+DEFAULT_CODEC = CODEC_ZSTD if zstandard is not None else CODEC_GZIP
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("该备份使用 zstd 压缩，请先安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    temp_path = path.with_name(f".{path.name}.tmp")
+    with open(temp_path, "wb") as handle:
+        handle.write(data)
+    os.replace(temp_path, path)
+
+
+class BackupStore:
+    """Deduplicated backups under ``<work_dir>/backups``.
+
+    Layout::
+
+        blobs/<hh>/<sha256><suffix>   compressed snapshot bodies
+        manifests/<name>.json         ordered snapshot refs, oldest first
+        refs.json                     blob reference counts
+        .lock                         serialises writers across processes
+
+    Identical content is stored once no matter how many snapshots point at
+    it. Retention pops from the head of a manifest, so trimming never has
+    to list or stat the backup directory.
+    """
+
+    def __init__(self, root: Path, codec: str = DEFAULT_CODEC):
+        self.root = Path(root)
+        self.codec = codec
+        self.blob_dir = self.root / "blobs"
+        self.manifest_dir = self.root / "manifests"
+        self.refs_path = self.root / "refs.json"
+        self.lock_path = self.root / ".lock"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the thread lock and an exclusive ``flock`` on ``.lock``.
+
+        The daemon and one-off ``clash-sub`` commands run as separate
+        processes, so every refs/manifest read-modify-write goes through here.
+        """
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, "a") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    # -- refcounts -----------------------------------------------------
+
+    def _load_refs(self) -> Dict[str, int]:
+        """Read the counts from disk; never cached, as other processes write them too."""
+        try:
+            with open(self.refs_path, "r", encoding="utf-8") as handle:
+                refs = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        return refs if isinstance(refs, dict) else {}
+
+    def _save_refs(self, refs: Dict[str, int]) -> None:
+        payload = json.dumps(refs, indent=0, sort_keys=True)
+        _write_atomic(self.refs_path, payload.encode("utf-8"))
+
+    def _count_refs(self, digest: str) -> int:
+        """Recount ``digest`` from the manifests on disk (used when refs.json lacks it)."""
+        return sum(
+            1 for name in self.names() for snapshot in self.snapshots(name) if snapshot["sha256"] == digest
+        )
+
+    # -- manifests -----------------------------------------------------
+
+    def _manifest_path(self, name: str) -> Path:
+        return self.manifest_dir / f"{name}.json"
+
+    def snapshots(self, name: str) -> List[Dict]:
+        """Return snapshot records for ``name``, oldest first."""
+        try:
+            with open(self._manifest_path(name), "r", encoding="utf-8") as handle:
+                return json.load(handle).get("snapshots", [])
+        except (OSError, ValueError):
+            return []
+
+    def names(self) -> List[str]:
+        if not self.manifest_dir.exists():
+            return []
+        return sorted(path.stem for path in self.manifest_dir.glob("*.json"))
+
+    def _save_manifest(self, name: str, snapshots: List[Dict]) -> None:
+        self.manifest_dir.mkdir(parents=True, exist_ok=True)
+        payload = json.dumps({"snapshots": snapshots}, indent=2, ensure_ascii=False)
+        _write_atomic(self._manifest_path(name), payload.encode("utf-8"))
+
+    # -- blobs ---------------------------------------------------------
+
+    def _blob_path(self, digest: str, codec: str) -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}{CODEC_SUFFIXES[codec]}"
+
+    def _store_blob(self, digest: str, data: bytes) -> str:
+        for codec in CODEC_SUFFIXES:
+            if self._blob_path(digest, codec).exists():
+                return codec
+        path = self._blob_path(digest, self.codec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path, _compress(data, self.codec))
+        return self.codec
+
+    def _release(self, refs: Dict[str, int], dropped: List[Dict]) -> None:
+        """Drop references held by ``dropped``; call after saving the trimmed manifest."""
+        codecs = {snapshot["sha256"]: snapshot.get("codec", CODEC_GZIP) for snapshot in dropped}
+        for digest, count in Counter(snapshot["sha256"] for snapshot in dropped).items():
+            if digest in refs:
+                remaining = refs[digest] - count
+            else:
+                # Unknown count (lost or stale refs.json): rebuild it from
+                # the manifests, which no longer list the dropped snapshots.
+                remaining = self._count_refs(digest)
+            if remaining > 0:
+                refs[digest] = remaining
+                continue
+            refs.pop(digest, None)
+            self._blob_path(digest, codecs[digest]).unlink(missing_ok=True)
+
+    # -- public API ----------------------------------------------------
+
+    def add(
+        self,
+        name: str,
+        source: Path,
+        digest: Optional[str] = None,
+        created: Optional[datetime] = None,
+    ) -> Optional[Dict]:
+        """Snapshot ``source`` for ``name``; returns None if it matches the latest."""
+        data = Path(source).read_bytes()
+        digest = digest or hashlib.sha256(data).hexdigest()
+        created = created or datetime.now()
+
+        with self._locked():
+            snapshots = self.snapshots(name)
+            if snapshots and snapshots[-1]["sha256"] == digest:
+                return None
+
+            codec = self._store_blob(digest, data)
+
+            snapshot_id = created.strftime("%Y%m%d_%H%M%S")
+            taken = {item["id"] for item in snapshots}
+            suffix = 2
+            base_id = snapshot_id
+            while snapshot_id in taken:
+                snapshot_id = f"{base_id}-{suffix}"
+                suffix += 1
+
+            snapshot = {
+                "id": snapshot_id,
+                "sha256": digest,
+                "size": len(data),
+                "codec": codec,
+                "created": int(created.timestamp()),
+            }
+            snapshots.append(snapshot)
+            self._save_manifest(name, snapshots)
+            refs = self._load_refs()
+            # A digest missing from refs.json may still be shared: recount it.
+            refs[digest] = refs[digest] + 1 if digest in refs else self._count_refs(digest)
+            self._save_refs(refs)
+            return snapshot
+
+    def trim(self, name: str, keep: int) -> List[Dict]:
+        """Drop the oldest snapshots beyond ``keep``; returns what was dropped."""
+        if keep <= 0:
+            return []
+        with self._locked():
+            snapshots = self.snapshots(name)
+            if len(snapshots) <= keep:
+                return []
+            dropped, snapshots = snapshots[:-keep], snapshots[-keep:]
+            self._save_manifest(name, snapshots)
+            refs = self._load_refs()
+            self._release(refs, dropped)
+            self._save_refs(refs)
+            return dropped
+
+    def find(self, name: str, snapshot_id: Optional[str] = None) -> Optional[Dict]:
+        """Return a snapshot by id, or the latest when ``snapshot_id`` is None."""
+        snapshots = self.snapshots(name)
+        if not snapshots:
+            return None
+        if snapshot_id is None:
+            return snapshots[-1]
+        for snapshot in snapshots:
+            if snapshot["id"] == snapshot_id:
+                return snapshot
+        return None
+
+    def read(self, snapshot: Dict) -> bytes:
+        codec = snapshot.get("codec", CODEC_GZIP)
+        blob = self._blob_path(snapshot["sha256"], codec).read_bytes()
+        return _decompress(blob, codec)
+
+    def import_legacy(self, name: str) -> int:
+        """Move old ``<name>.<timestamp>.yaml`` copies into the store once."""
+        if self._manifest_path(name).exists():
+            return 0
+        legacy = sorted(self.root.glob(f"{name}.*.yaml"), key=lambda file: file.stat().st_mtime)
+        for path in legacy:
+            stamp = path.name[len(name) + 1 : -len(".yaml")]
+            try:
+                created = datetime.strptime(stamp, "%Y%m%d_%H%M%S")
+            except ValueError:
+                created = datetime.fromtimestamp(path.stat().st_mtime)
+            self.add(name, path, created=created)
+            path.unlink(missing_ok=True)
+        return len(legacy)
@@ -17,6 +17,7 @@ from .config import (
     write_sample_config,
 )
 from .console import Colors
+from .daemon import UpdateScheduler
 from .subscription_manager import ClashSubscriptionManager
 
 
@@ -27,8 +28,16 @@ def build_parser(config_display: str) -> argparse.ArgumentParser:
         epilog="""
 示例:
   clash-sub list                                    # 列出所有订阅
+  clash-sub list --rescan                           # 从已下载文件重建元数据索引后列出
   clash-sub update x-superflash                     # 更新指定订阅
   clash-sub update-all                              # 更新所有订阅
+  clash-sub update-all --jobs 8                     # 并发更新所有订阅
+  clash-sub daemon                                  # 常驻运行，按各订阅的间隔自动更新
+  clash-sub history x-superflash                    # 查看指定订阅的更新历史
+  clash-sub stats --days 7                          # 最近 7 天的更新统计
+  clash-sub merge merged.yaml --from a,b,c          # 合并多个订阅并按连接信息去重
+  clash-sub backups list                            # 列出所有备份
+  clash-sub backups restore x-superflash            # 恢复最新备份
   clash-sub init-config                             # 生成配置模板
         """,
     )
@@ -41,12 +50,31 @@ def build_parser(config_display: str) -> argparse.ArgumentParser:
 
     subparsers = parser.add_subparsers(dest="command", help="可用命令")
 
-    subparsers.add_parser("list", help="列出所有订阅")
+    list_parser = subparsers.add_parser("list", help="列出所有订阅")
+    list_parser.add_argument("--rescan", action="store_true", help="先从已下载文件重建元数据索引")
 
     update_parser = subparsers.add_parser("update", help="更新指定订阅")
     update_parser.add_argument("name", help="订阅名称")
 
-    subparsers.add_parser("update-all", help="更新所有启用的订阅")
+    update_all_parser = subparsers.add_parser("update-all", help="更新所有启用的订阅")
+    update_all_parser.add_argument("--jobs", "-j", type=int, help="并发更新数量 (默认读取配置 update.jobs，缺省为 1)")
+    update_all_parser.add_argument("--per-host", type=int, help="同一主机的最大并发请求数 (默认: 2)")
+
+    daemon_parser = subparsers.add_parser("daemon", help="常驻运行，按各订阅的更新间隔自动更新")
+    daemon_parser.add_argument("--interval", type=float, help="默认更新间隔小时数 (默认读取 daemon.interval，缺省为 12)")
+    daemon_parser.add_argument("--jobs", "-j", type=int, help="同时到期时的并发更新数量 (默认读取 update.jobs)")
+    daemon_parser.add_argument("--rounds", type=int, help="完成指定轮数后退出 (默认: 持续运行)")
+
+    history_parser = subparsers.add_parser("history", help="查看更新历史")
+    history_parser.add_argument("name", nargs="?", help="订阅名称 (默认: 全部)")
+    history_parser.add_argument("--limit", "-n", type=int, default=20, help="显示条数 (默认: 20)")
+
+    stats_parser = subparsers.add_parser("stats", help="按订阅汇总更新成功率与耗时")
+    stats_parser.add_argument("--days", type=float, help="只统计最近 N 天 (默认: 全部)")
+
+    merge_parser = subparsers.add_parser("merge", help="将多个订阅合并为一个去重后的配置")
+    merge_parser.add_argument("output", help="输出文件路径")
+    merge_parser.add_argument("--from", dest="sources", help="逗号分隔的订阅名称 (默认: 全部启用的订阅)")
 
     add_parser = subparsers.add_parser("add", help="添加新订阅")
     add_parser.add_argument("name", help="订阅名称")
@@ -69,6 +97,14 @@ def build_parser(config_display: str) -> argparse.ArgumentParser:
     init_parser.add_argument("--secret", help="Clash API Secret (默认: 空)")
     init_parser.add_argument("--skip-import-party", action="store_true", help="跳过自动导入 Clash Party 订阅")
 
+    backups_parser = subparsers.add_parser("backups", help="查看或恢复订阅备份")
+    backups_sub = backups_parser.add_subparsers(dest="backups_command", help="备份操作")
+    backups_list = backups_sub.add_parser("list", help="列出备份")
+    backups_list.add_argument("name", nargs="?", help="订阅名称 (默认: 全部)")
+    backups_restore = backups_sub.add_parser("restore", help="恢复备份")
+    backups_restore.add_argument("name", help="订阅名称")
+    backups_restore.add_argument("snapshot", nargs="?", help="备份 ID (默认: 最新)")
+
     import_party_parser = subparsers.add_parser("import-party", help="从 Clash Party 导入订阅")
     import_party_parser.add_argument("--overwrite", action="store_true", help="覆盖同名订阅")
     import_party_parser.add_argument("--prefix", default="", help="为导入的订阅名称添加前缀")
@@ -180,11 +216,22 @@ def main(argv: list[str] | None = None) -> int:
 
     try:
         if args.command == "list":
-            manager.list_subscriptions()
+            manager.list_subscriptions(rescan=args.rescan)
         elif args.command == "update":
             manager.update_subscription(args.name)
         elif args.command == "update-all":
-            manager.update_all()
+            manager.update_all(jobs=args.jobs, per_host=args.per_host)
+        elif args.command == "daemon":
+            scheduler = UpdateScheduler.from_config(manager, interval_hours=args.interval, jobs=args.jobs)
+            scheduler.run(rounds=args.rounds)
+        elif args.command == "history":
+            manager.show_history(args.name, args.limit)
+        elif args.command == "stats":
+            manager.show_stats(args.days)
+        elif args.command == "merge":
+            names = [name.strip() for name in (args.sources or "").split(",") if name.strip()]
+            if not manager.merge_subscriptions(args.output, names):
+                return 1
         elif args.command == "add":
             manager.add_subscription(args.name, args.url, args.description)
         elif args.command == "remove":
@@ -193,6 +240,11 @@ def main(argv: list[str] | None = None) -> int:
             manager.toggle_subscription(args.name)
         elif args.command == "restart":
             manager.restart_clash(skip_check=args.skip_check)
+        elif args.command == "backups":
+            if args.backups_command == "restore":
+                manager.restore_backup(args.name, args.snapshot)
+            else:
+                manager.list_backups(getattr(args, "name", None))
         elif args.command == "import-party":
             manager.import_subscriptions_from_party(overwrite=args.overwrite, prefix=args.prefix or "")
     except KeyboardInterrupt:
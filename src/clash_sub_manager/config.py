@@ -124,13 +124,34 @@ def detect_api_credentials() -> Optional[Tuple[str, str]]:
     return None
 
 
-def read_api_from_config(path: Optional[str | Path] = None) -> Tuple[str, str]:
+def read_config_data(path: Optional[str | Path] = None) -> Dict:
+    """Load the raw config JSON."""
     config_path = resolve_config_path(path)
     if not config_path.exists():
         raise FileNotFoundError(f"未找到配置文件: {config_path}")
 
     with open(config_path, "r", encoding="utf-8") as handle:
-        data = json.load(handle)
+        return json.load(handle)
+
+
+def write_config_data(path: str | Path, data: Dict) -> None:
+    """Replace the config JSON atomically."""
+    config_path = resolve_config_path(path)
+    config_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = config_path.with_name(f".{config_path.name}.tmp")
+    temp_path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(temp_path, config_path)
+
+
+def resolve_work_dir(data: Dict, config_path: Path) -> Path:
+    """Return the work dir a config points at (``clash_dir`` wins for old configs)."""
+    if data.get("clash_dir"):
+        return Path(data["clash_dir"]).expanduser()
+    return Path(data.get("work_dir") or Path(config_path).parent).expanduser()
+
+
+def read_api_from_config(path: Optional[str | Path] = None) -> Tuple[str, str]:
+    data = read_config_data(path)
 
     api_cfg = data.get("api", {}) or {}
     url = os.getenv("CLASH_API_URL") or api_cfg.get("url")
@@ -1,5 +1,12 @@
 """Terminal formatting helpers."""
 
+from __future__ import annotations
+
+import io
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
 
 class Colors:
     """Simple ANSI color helpers used across CLIs."""
@@ -11,3 +18,41 @@ class Colors:
     MAGENTA = '\033[0;35m'
     CYAN = '\033[0;36m'
     NC = '\033[0m'
+
+
+class ThreadOutputRouter:
+    """Route ``print`` output from worker threads into per-thread buffers.
+
+    Concurrent jobs print multi-line progress blocks; buffering them per
+    thread and flushing each block whole keeps the terminal readable.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            with self._lock:
+                return self._stream.write(text)
+        buffer.write(text)
+        return len(text)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._stream.flush()
+
+    @contextmanager
+    def capture(self) -> Iterator[None]:
+        """Buffer this thread's output and emit it in one piece on exit."""
+        self._local.buffer = io.StringIO()
+        try:
+            yield
+        finally:
+            text = self._local.buffer.getvalue()
+            self._local.buffer = None
+            with self._lock:
+                self._stream.write(text)
+                self._stream.flush()
@@ -0,0 +1,226 @@
+"""Long-running update scheduler behind ``clash-sub daemon``."""
+
+from __future__ import annotations
+
+import heapq
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .console import Colors
+from .subscription_manager import DEFAULT_JOBS, STATUS_SKIPPED, SUCCESS_STATUSES, ClashSubscriptionManager
+
+DEFAULT_INTERVAL_HOURS = 12.0
+DEFAULT_JITTER = 0.1
+MAX_JITTER_SECONDS = 900
+DEFAULT_RETRY_BASE = 60.0
+DEFAULT_RETRY_MAX = 3600.0
+# Provider hints below this are ignored so a typo cannot hammer the host.
+MIN_INTERVAL_SECONDS = 300
+# Overdue subscriptions at start-up are spread over this many seconds.
+STARTUP_SPREAD = 30
+# Upper bound on one sleep, so config edits are noticed promptly.
+POLL_SECONDS = 60
+
+SOURCE_CONFIG = "配置"
+SOURCE_PROVIDER = "服务商"
+SOURCE_DEFAULT = "默认"
+
+
+class UpdateScheduler:
+    """Keep every enabled subscription on its own update cadence.
+
+    The interval comes from the subscription's ``update_interval`` (hours)
+    in config.json, else the provider's ``profile-update-interval`` header
+    recorded at the last fetch, else ``daemon.interval``. Each next run is
+    pushed back by a random jitter; failures retry with exponential
+    backoff. The manager, its HTTP pool and its indexes live for the whole
+    process, and config.json is re-read only when its mtime changes.
+    """
+
+    def __init__(
+        self,
+        manager: ClashSubscriptionManager,
+        interval_hours: float = DEFAULT_INTERVAL_HOURS,
+        jitter: float = DEFAULT_JITTER,
+        retry_base: float = DEFAULT_RETRY_BASE,
+        retry_max: float = DEFAULT_RETRY_MAX,
+        jobs: Optional[int] = None,
+    ):
+        self.manager = manager
+        self.default_interval = max(MIN_INTERVAL_SECONDS, interval_hours * 3600)
+        self.jitter = max(0.0, jitter)
+        self.retry_base = max(1.0, retry_base)
+        self.retry_max = max(self.retry_base, retry_max)
+        self.jobs = jobs
+
+        self._queue: List[Tuple[float, str]] = []
+        self._due: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}
+        self._config_mtime = self._stat_config()
+
+    @classmethod
+    def from_config(cls, manager: ClashSubscriptionManager, **overrides) -> "UpdateScheduler":
+        daemon_cfg = manager.config.get("daemon", {}) or {}
+        options = {
+            "interval_hours": daemon_cfg.get("interval", DEFAULT_INTERVAL_HOURS),
+            "jitter": daemon_cfg.get("jitter", DEFAULT_JITTER),
+            "retry_base": daemon_cfg.get("retry_base", DEFAULT_RETRY_BASE),
+            "retry_max": daemon_cfg.get("retry_max", DEFAULT_RETRY_MAX),
+        }
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(manager, **options)
+
+    # -- intervals -----------------------------------------------------
+
+    def interval_for(self, name: str) -> Tuple[float, str]:
+        """Return ``(seconds, source)`` for a subscription's update interval."""
+        sub = self.manager.config.get("subscriptions", {}).get(name, {})
+        if sub.get("update_interval"):
+            return max(MIN_INTERVAL_SECONDS, float(sub["update_interval"]) * 3600), SOURCE_CONFIG
+        hinted = self.manager.metadata.get(name).get("update_interval")
+        if hinted:
+            return max(MIN_INTERVAL_SECONDS, float(hinted)), SOURCE_PROVIDER
+        return self.default_interval, SOURCE_DEFAULT
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds + random.uniform(0, min(seconds * self.jitter, MAX_JITTER_SECONDS))
+
+    def retry_delay(self, failures: int) -> float:
+        """Backoff after ``failures`` consecutive failures, with jitter."""
+        base = min(self.retry_max, self.retry_base * (2 ** max(0, failures - 1)))
+        return base + random.uniform(0, base / 2)
+
+    # -- queue ---------------------------------------------------------
+
+    def _schedule(self, name: str, due: float) -> None:
+        self._due[name] = due
+        heapq.heappush(self._queue, (due, name))
+
+    def _enabled(self) -> List[str]:
+        return [
+            name
+            for name, sub in self.manager.config.get("subscriptions", {}).items()
+            if sub.get("enabled", True)
+        ]
+
+    def plan(self, now: Optional[float] = None) -> None:
+        """Schedule enabled subscriptions that are not queued yet and drop the rest."""
+        now = time.time() if now is None else now
+        enabled = set(self._enabled())
+        for name in list(self._due):
+            if name not in enabled:
+                del self._due[name]
+                self._failures.pop(name, None)
+
+        for name in self._enabled():
+            if name in self._due:
+                continue
+            interval, _ = self.interval_for(name)
+            checked = self.manager.metadata.get(name).get("checked")
+            due = checked + self._jittered(interval) if checked else now
+            if due <= now:
+                due = now + random.uniform(0, STARTUP_SPREAD)
+            self._schedule(name, due)
+
+    def _pop_due(self, now: float) -> List[str]:
+        names: List[str] = []
+        while self._queue and self._queue[0][0] <= now:
+            due, name = heapq.heappop(self._queue)
+            # Skip stale heap entries left behind by rescheduling or removal.
+            if self._due.get(name) == due and name not in names:
+                names.append(name)
+        return names
+
+    def _next_due(self) -> Optional[float]:
+        while self._queue and self._due.get(self._queue[0][1]) != self._queue[0][0]:
+            heapq.heappop(self._queue)
+        return self._queue[0][0] if self._queue else None
+
+    # -- config --------------------------------------------------------
+
+    def _stat_config(self) -> Optional[int]:
+        try:
+            return self.manager.config_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload_config_if_changed(self) -> None:
+        mtime = self._stat_config()
+        if mtime == self._config_mtime:
+            return
+        self._config_mtime = mtime
+        try:
+            self.manager.config = self.manager.load_config()
+        except (OSError, ValueError) as exc:
+            print(f"{Colors.YELLOW}⚠ 重新读取配置失败，继续使用旧配置: {exc}{Colors.NC}")
+            return
+        print(f"{Colors.BLUE}配置文件已变更，已重新加载{Colors.NC}")
+        # Intervals may have changed: rebuild the whole plan.
+        self._queue.clear()
+        self._due.clear()
+        self.plan()
+
+    # -- running -------------------------------------------------------
+
+    def run_round(self, names: List[str]) -> None:
+        update_cfg = self.manager.config.get("update", {}) or {}
+        jobs = max(1, min(len(names), self.jobs or update_cfg.get("jobs", DEFAULT_JOBS)))
+        results = self.manager.update_many(names, jobs)
+
+        now = time.time()
+        for name, status, _ in results:
+            if name not in self._due:
+                continue
+            if status in SUCCESS_STATUSES or status == STATUS_SKIPPED:
+                self._failures.pop(name, None)
+                interval, _ = self.interval_for(name)
+                self._schedule(name, now + self._jittered(interval))
+            else:
+                failures = self._failures.get(name, 0) + 1
+                self._failures[name] = failures
+                self._schedule(name, now + self.retry_delay(failures))
+
+    def print_schedule(self) -> None:
+        if not self._due:
+            print(f"{Colors.YELLOW}没有启用的订阅{Colors.NC}")
+            return
+        width = max(len(name) for name in self._due)
+        for name, due in sorted(self._due.items(), key=lambda item: item[1]):
+            interval, source = self.interval_for(name)
+            failures = self._failures.get(name)
+            note = f" · 已连续失败 {failures} 次" if failures else ""
+            print(
+                f"  {Colors.BLUE}{name:{width}s}{Colors.NC}  "
+                f"{datetime.fromtimestamp(due).strftime('%m-%d %H:%M:%S')}  "
+                f"(每 {interval / 3600:g} 小时，{source}){note}"
+            )
+
+    def run(self, rounds: Optional[int] = None) -> None:
+        """Loop until interrupted (or for ``rounds`` update rounds)."""
+        print(f"\n{Colors.MAGENTA}{'='*60}{Colors.NC}")
+        print(f"{Colors.MAGENTA}订阅更新守护进程{Colors.NC}")
+        print(f"{Colors.MAGENTA}{'='*60}{Colors.NC}")
+
+        self.plan()
+        print(f"\n{Colors.CYAN}更新计划:{Colors.NC}")
+        self.print_schedule()
+
+        completed = 0
+        while rounds is None or completed < rounds:
+            self._reload_config_if_changed()
+            next_due = self._next_due()
+            now = time.time()
+            if next_due is None or next_due > now:
+                time.sleep(POLL_SECONDS if next_due is None else min(POLL_SECONDS, next_due - now))
+                continue
+
+            names = self._pop_due(now)
+            if not names:
+                continue
+            print(f"\n{Colors.CYAN}[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 到期: {', '.join(names)}{Colors.NC}")
+            self.run_round(names)
+            completed += 1
+            print(f"{Colors.CYAN}下次更新:{Colors.NC}")
+            self.print_schedule()
@@ -0,0 +1,175 @@
+"""Update history kept in an SQLite database inside ``work_dir``."""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+HISTORY_FILENAME = "history.db"
+HISTORY_SCHEMA_VERSION = 1
+# Buffered runs are written in one transaction once this many are pending.
+FLUSH_BATCH = 32
+BUSY_TIMEOUT_MS = 5000
+PHASES = ("download", "validate", "backup", "sync")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    started REAL NOT NULL,
+    status TEXT NOT NULL,
+    http_status INTEGER,
+    bytes INTEGER,
+    sha256 TEXT,
+    nodes INTEGER,
+    error TEXT,
+    total_ms INTEGER NOT NULL,
+    download_ms INTEGER,
+    validate_ms INTEGER,
+    backup_ms INTEGER,
+    sync_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_name_started ON runs (name, started);
+"""
+
+_COLUMNS = (
+    "name", "started", "status", "http_status", "bytes", "sha256", "nodes", "error", "total_ms",
+) + tuple(f"{phase}_ms" for phase in PHASES)
+
+
+class UpdateRun:
+    """What one ``update_subscription`` call did, filled in as it goes."""
+
+    __slots__ = ("name", "started", "status", "http_status", "bytes", "sha256", "nodes", "error", "total_ms", "phases")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.status = ""
+        self.http_status: Optional[int] = None
+        self.bytes: Optional[int] = None
+        self.sha256: Optional[str] = None
+        self.nodes: Optional[int] = None
+        self.error: Optional[str] = None
+        self.total_ms = 0
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Add the time spent inside the block to phase ``name``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def row(self) -> tuple:
+        phases = tuple(
+            int(self.phases[phase] * 1000) if phase in self.phases else None for phase in PHASES
+        )
+        return (
+            self.name, self.started, self.status, self.http_status, self.bytes,
+            self.sha256, self.nodes, self.error, self.total_ms,
+        ) + phases
+
+
+class UpdateHistory:
+    """Append-only run log in ``history.db``.
+
+    Runs are buffered in memory and written in batches, one transaction
+    per flush. The database uses WAL so ``clash-sub history`` can read
+    while a daemon writes; a single connection guarded by a lock serves
+    all update threads of this process.
+    """
+
+    def __init__(self, work_dir: Path):
+        self.path = Path(work_dir) / HISTORY_FILENAME
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] < HISTORY_SCHEMA_VERSION:
+                with conn:
+                    conn.executescript(_SCHEMA)
+                    conn.execute(f"PRAGMA user_version={HISTORY_SCHEMA_VERSION}")
+            self._conn = conn
+        return self._conn
+
+    def record(self, run: UpdateRun) -> None:
+        """Queue ``run``; the queue is flushed once it reaches ``FLUSH_BATCH``."""
+        with self._lock:
+            self._pending.append(run.row())
+            if len(self._pending) >= FLUSH_BATCH:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """Write all queued runs in one transaction."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        conn = self._connect()
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        with conn:
+            conn.executemany(f"INSERT INTO runs ({', '.join(_COLUMNS)}) VALUES ({placeholders})", rows)
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._flush_locked()
+            finally:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        if not self.path.exists():
+            return []
+        with self._lock:
+            self._flush_locked()
+            return self._connect().execute(sql, params).fetchall()
+
+    def runs(self, name: Optional[str] = None, limit: int = 20) -> List[sqlite3.Row]:
+        """Most recent runs first, optionally for one subscription."""
+        where = "WHERE name = ?" if name else ""
+        params = (name, limit) if name else (limit,)
+        return self._query(f"SELECT * FROM runs {where} ORDER BY started DESC LIMIT ?", params)
+
+    def stats(self, since: Optional[float] = None) -> List[sqlite3.Row]:
+        """Per-subscription aggregates over runs started after ``since``.
+
+        Entries for disabled subscriptions never count towards the rates.
+        """
+        return self._query(
+            """
+            SELECT name,
+                   COUNT(*) AS runs,
+                   SUM(status IN ('updated', 'not-modified', 'unchanged')) AS ok,
+                   SUM(status = 'failed') AS failed,
+                   SUM(status = 'updated') AS changed,
+                   AVG(total_ms) AS avg_ms,
+                   MAX(total_ms) AS max_ms,
+                   AVG(download_ms) AS avg_download_ms,
+                   SUM(COALESCE(bytes, 0)) AS bytes,
+                   MAX(CASE WHEN status = 'updated' THEN started END) AS last_changed,
+                   MAX(CASE WHEN status = 'failed' THEN started END) AS last_failed
+            FROM runs
+            WHERE started >= ? AND status != 'disabled'
+            GROUP BY name
+            ORDER BY name
+            """,
+            (since or 0,),
+        )
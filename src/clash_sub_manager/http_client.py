@@ -0,0 +1,127 @@
+"""Shared pooled HTTP session with retries and per-endpoint timeouts."""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Seconds; "delay" is derived from the probe timeout by the caller.
+ENDPOINT_TIMEOUTS: Dict[str, float] = {
+    "subscription": 30,
+    "proxies": 5,
+    "switch": 5,
+    "reload": 5,
+    "check": 3,
+    "configs": 5,
+}
+
+# The controller answers 503/504 when a node is dead; retrying those only
+# multiplies the cost of a failed probe.
+NO_RETRY_ENDPOINTS = frozenset({"delay"})
+
+
+class HttpClient:
+    """A keep-alive ``requests.Session`` with bounded retries.
+
+    Transient failures (connection errors, timeouts and the statuses in
+    ``RETRY_STATUSES``) are retried with exponential backoff plus jitter.
+    Each call names its endpoint so timeouts can be tuned per endpoint.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        self.retries = max(0, int(retries))
+        self.backoff = max(0.0, float(backoff))
+        self.timeouts = {**ENDPOINT_TIMEOUTS, **(timeouts or {})}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict]) -> "HttpClient":
+        """Build a client from the ``http`` section of config.json."""
+        settings = settings or {}
+        return cls(
+            pool_size=int(settings.get("pool_size", DEFAULT_POOL_SIZE)),
+            retries=settings.get("retries", DEFAULT_RETRIES),
+            backoff=settings.get("backoff", DEFAULT_BACKOFF),
+            timeouts=settings.get("timeouts"),
+        )
+
+    def timeout_for(self, endpoint: str) -> float:
+        return self.timeouts.get(endpoint, ENDPOINT_TIMEOUTS["proxies"])
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff for ``attempt`` (0-based) with random jitter."""
+        base = self.backoff * (2 ** attempt)
+        return base + random.uniform(0, base)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str,
+        retries: Optional[int] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request, retrying transient failures for ``endpoint``."""
+        kwargs.setdefault("timeout", self.timeout_for(endpoint))
+        if retries is None:
+            retries = 0 if endpoint in NO_RETRY_ENDPOINTS else self.retries
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                response.close()
+
+            time.sleep(self.backoff_delay(attempt))
+            attempt += 1
+
+    def get(self, url: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def put(self, url: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, endpoint, **kwargs)
+
+    def patch(self, url: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", url, endpoint, **kwargs)
+
+
+_shared_client: Optional[HttpClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_client(settings: Optional[Dict] = None) -> HttpClient:
+    """Return the process-wide client, creating it from ``settings`` once."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient.from_settings(settings)
+        return _shared_client
@@ -0,0 +1,243 @@
+"""Persistent per-node latency history with percentile and EWMA scoring."""
+
+from __future__ import annotations
+
+import base64
+import json
+import math
+import os
+import sys
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+LATENCY_FILENAME = "latency.json"
+LATENCY_VERSION = 1
+DEFAULT_CAPACITY = 64
+DEFAULT_ALPHA = 0.3
+# A lost probe counts as this many ms in the EWMA so flaky nodes sink.
+LOSS_PENALTY_MS = 5000
+MAX_SAMPLE_MS = 0xFFFF
+# Queue position for nodes without history: ahead of known-dead ones.
+UNKNOWN_SCORE = 1000
+MIN_PROBE_TIMEOUT = 500
+DEAD_PROBE_TIMEOUT = 1000
+
+
+def _pack(values: array) -> str:
+    data = array(values.typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return base64.b64encode(data.tobytes()).decode("ascii")
+
+
+def _unpack(typecode: str, text: str) -> array:
+    data = array(typecode)
+    data.frombytes(base64.b64decode(text))
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data
+
+
+class LatencyRing:
+    """Fixed-capacity ring of delay samples; ``0`` marks a lost probe."""
+
+    __slots__ = ("samples", "stamps", "cursor", "ewma")
+
+    def __init__(self) -> None:
+        self.samples = array("H")
+        self.stamps = array("I")
+        self.cursor = 0
+        self.ewma: Optional[float] = None
+
+    def add(self, delay: Optional[int], stamp: int, capacity: int, alpha: float) -> None:
+        value = min(int(delay), MAX_SAMPLE_MS) if delay else 0
+        if len(self.samples) < capacity:
+            self.samples.append(value)
+            self.stamps.append(stamp)
+        else:
+            self.samples[self.cursor] = value
+            self.stamps[self.cursor] = stamp
+            self.cursor = (self.cursor + 1) % capacity
+
+        effective = value or LOSS_PENALTY_MS
+        self.ewma = effective if self.ewma is None else alpha * effective + (1 - alpha) * self.ewma
+
+    def ordered(self) -> List[int]:
+        """Samples oldest first."""
+        return list(self.samples[self.cursor :]) + list(self.samples[: self.cursor])
+
+    def last_stamp(self) -> int:
+        if not self.stamps:
+            return 0
+        return self.stamps[(self.cursor - 1) % len(self.stamps)]
+
+
+class NodeStats:
+    """Summary of one node's history."""
+
+    __slots__ = ("name", "count", "p50", "p95", "loss_rate", "ewma", "last")
+
+    def __init__(self, name: str, ring: LatencyRing):
+        ordered = ring.ordered()
+        alive = sorted(value for value in ordered if value)
+        self.name = name
+        self.count = len(ordered)
+        self.p50 = percentile(alive, 50)
+        self.p95 = percentile(alive, 95)
+        self.loss_rate = (len(ordered) - len(alive)) / len(ordered) if ordered else 0.0
+        self.ewma = ring.ewma
+        self.last = ordered[-1] if ordered else None
+
+    @property
+    def score(self) -> float:
+        """Lower is better; unknown nodes rank last."""
+        return self.ewma if self.ewma is not None else float("inf")
+
+
+def adaptive_timeout(stats: Optional[NodeStats], default: int) -> int:
+    """Probe timeout (ms) derived from a node's recent behaviour.
+
+    Healthy nodes get ~3x their P95, nodes that never answered get a short
+    probe, and unknown nodes keep ``default``.
+    """
+    if stats is None:
+        return default
+    if stats.p95 is None:
+        return min(default, DEAD_PROBE_TIMEOUT)
+    return max(MIN_PROBE_TIMEOUT, min(default, stats.p95 * 3))
+
+
+def percentile(sorted_values: List[int], pct: float) -> Optional[int]:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(len(sorted_values) * pct / 100))
+    return sorted_values[rank - 1]
+
+
+class LatencyStore:
+    """Ring-buffered delay history for every node, saved in ``work_dir``.
+
+    Each node keeps its last ``capacity`` samples in ``array('H')`` and
+    their timestamps in ``array('I')``; the EWMA is updated incrementally.
+    On disk the arrays are stored as base64 so the file stays small.
+    """
+
+    def __init__(self, path: Path, capacity: int = DEFAULT_CAPACITY, alpha: float = DEFAULT_ALPHA):
+        self.path = Path(path)
+        self.capacity = max(1, capacity)
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._rings: Dict[str, LatencyRing] = {}
+        # Throughput results from ``clash-proxy speed``: last run plus an EWMA.
+        self._speed: Dict[str, Dict] = {}
+        self._dirty = False
+        self._load()
+
+    @classmethod
+    def in_dir(cls, work_dir: Path, **kwargs) -> "LatencyStore":
+        return cls(Path(work_dir) / LATENCY_FILENAME, **kwargs)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != LATENCY_VERSION:
+            return
+        for name, record in (data.get("nodes") or {}).items():
+            ring = LatencyRing()
+            ring.samples = _unpack("H", record["samples"])
+            ring.stamps = _unpack("I", record["stamps"])
+            ring.ewma = record.get("ewma")
+            # Normalise to oldest-first so a changed capacity stays consistent.
+            cursor = record.get("cursor", 0) % max(1, len(ring.samples))
+            ring.samples = (ring.samples[cursor:] + ring.samples[:cursor])[-self.capacity :]
+            ring.stamps = (ring.stamps[cursor:] + ring.stamps[:cursor])[-self.capacity :]
+            self._rings[name] = ring
+        self._speed = data.get("speed") or {}
+
+    def save(self) -> None:
+        """Persist if anything changed since the last save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            nodes = {
+                name: {
+                    "samples": _pack(ring.samples),
+                    "stamps": _pack(ring.stamps),
+                    "cursor": ring.cursor,
+                    "ewma": round(ring.ewma, 2) if ring.ewma is not None else None,
+                }
+                for name, ring in self._rings.items()
+            }
+            payload = {
+                "version": LATENCY_VERSION,
+                "capacity": self.capacity,
+                "nodes": nodes,
+                "speed": self._speed,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_suffix(".json.tmp")
+            with open(temp_path, "w", encoding="utf-8") as handle:
+                json.dump(payload, handle, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+            self._dirty = False
+
+    def record(self, name: str, delay: Optional[int], stamp: Optional[int] = None) -> None:
+        """Add one measurement; ``None``/``0`` counts as a lost probe."""
+        stamp = int(stamp or time.time())
+        with self._lock:
+            ring = self._rings.get(name)
+            if ring is None:
+                ring = self._rings[name] = LatencyRing()
+            ring.add(delay, stamp, self.capacity, self.alpha)
+            self._dirty = True
+
+    def record_many(self, results: Dict[str, Optional[int]]) -> None:
+        stamp = int(time.time())
+        for name, delay in results.items():
+            self.record(name, delay, stamp)
+
+    def record_speed(self, name: str, mbps: float, ttfb_ms: int, stamp: Optional[int] = None) -> None:
+        """Store one throughput result; ``mbps`` of 0 marks a failed download."""
+        with self._lock:
+            previous = self._speed.get(name) or {}
+            ewma = previous.get("ewma")
+            ewma = mbps if ewma is None else self.alpha * mbps + (1 - self.alpha) * ewma
+            self._speed[name] = {
+                "mbps": round(mbps, 2),
+                "ttfb": int(ttfb_ms),
+                "ewma": round(ewma, 2),
+                "at": int(stamp or time.time()),
+            }
+            self._dirty = True
+
+    def speed(self, name: str) -> Optional[Dict]:
+        """Last throughput record of ``name`` (``mbps``/``ttfb``/``ewma``/``at``)."""
+        with self._lock:
+            record = self._speed.get(name)
+            return dict(record) if record else None
+
+    def stats(self, name: str) -> Optional[NodeStats]:
+        with self._lock:
+            ring = self._rings.get(name)
+            return NodeStats(name, ring) if ring is not None and len(ring.samples) else None
+
+    def probe_order(self, names: Iterable[str]) -> List[str]:
+        """Order ``names`` best-first, with untested nodes before bad ones."""
+
+        def key(name: str) -> float:
+            stats = self.stats(name)
+            return stats.score if stats is not None else UNKNOWN_SCORE
+
+        return sorted(names, key=key)
+
+    def ranked(self, names: Iterable[str]) -> List[NodeStats]:
+        """Stats for ``names`` that have history, best score first."""
+        stats = [item for item in (self.stats(name) for name in names) if item is not None]
+        return sorted(stats, key=lambda item: item.score)
@@ -0,0 +1,188 @@
+"""Merge several downloaded subscriptions into one deduplicated profile."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .yaml_utils import dump_yaml, load_yaml
+
+SELECT_GROUP = "节点选择"
+AUTO_GROUP = "自动选择"
+AUTO_TEST_URL = "http://www.gstatic.com/generate_204"
+AUTO_TEST_INTERVAL = 300
+# Fields that, with type/server/port, decide which endpoint a node reaches.
+CREDENTIAL_FIELDS = (
+    "uuid",
+    "password",
+    "username",
+    "cipher",
+    "auth",
+    "auth-str",
+    "private-key",
+    "psk",
+    "token",
+)
+BUILTIN_TARGETS = frozenset(("DIRECT", "REJECT", "REJECT-DROP", "PASS", "COMPATIBLE"))
+RULE_OPTIONS = frozenset(("no-resolve", "src"))
+# Top-level keys rebuilt by the merge rather than copied from the base source.
+REBUILT_KEYS = ("proxies", "proxy-groups", "proxy-providers", "rules")
+
+
+def identity_key(proxy: Dict) -> Optional[str]:
+    """Hash of the connection identity of ``proxy`` (None if it has no endpoint)."""
+    proxy_type = str(proxy.get("type", "")).strip().lower()
+    server = str(proxy.get("server", "")).strip().lower()
+    if not proxy_type or not server:
+        return None
+    parts = [proxy_type, server, str(proxy.get("port", "")).strip()]
+    parts.extend(f"{field}={proxy[field]}" for field in CREDENTIAL_FIELDS if proxy.get(field) not in (None, ""))
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def retarget_rule(rule: str, targets: Set[str], fallback: str) -> str:
+    """Point ``rule`` at ``fallback`` if its policy is not one of ``targets``."""
+    parts = rule.split(",")
+    position = len(parts) - 1
+    if position > 1 and parts[position].strip() in RULE_OPTIONS:
+        position -= 1
+    target = parts[position].strip()
+    if position == 0 or target in BUILTIN_TARGETS or target in targets:
+        return rule
+    parts[position] = fallback
+    return ",".join(parts)
+
+
+class MergeResult:
+    __slots__ = ("sources", "seen", "kept", "duplicates", "renamed", "invalid", "dropped_providers")
+
+    def __init__(self) -> None:
+        self.sources: List[str] = []
+        self.seen = 0
+        self.kept = 0
+        self.duplicates = 0
+        self.renamed = 0
+        self.invalid = 0
+        # Sources whose proxy-providers were left out of the merged profile.
+        self.dropped_providers: List[str] = []
+
+
+class SubscriptionMerger:
+    """Accumulate sources, keeping the first node for each connection identity.
+
+    Both dedupe and naming are dictionary/set lookups, so the merge is
+    linear in the number of nodes. A node whose name is already taken by a
+    different endpoint is renamed ``"<name> (<source>)"``. Only inline
+    ``proxies`` are merged; ``proxy-providers`` are reported and dropped.
+    """
+
+    def __init__(self, source_names: Iterable[str]):
+        self.source_names = list(source_names)
+        reserved = [name for name in self.source_names if name in (SELECT_GROUP, AUTO_GROUP)]
+        if reserved:
+            raise ValueError(f"订阅名称与合并生成的策略组重名: {', '.join(reserved)}")
+        self.proxies: List[Dict] = []
+        self.by_identity: Dict[str, str] = {}
+        self.taken: Set[str] = {SELECT_GROUP, AUTO_GROUP, *self.source_names}
+        self.source_members: Dict[str, List[str]] = {name: [] for name in self.source_names}
+        self.base: Dict = {}
+        self.result = MergeResult()
+
+    def add_source(self, source: str, document: Dict) -> None:
+        if not self.base:
+            self.base = document
+        self.result.sources.append(source)
+        members = self.source_members[source]
+        listed: Set[str] = set()
+        if document.get("proxy-providers"):
+            self.result.dropped_providers.append(source)
+
+        for proxy in document.get("proxies") or []:
+            self.result.seen += 1
+            key = identity_key(proxy) if isinstance(proxy, dict) else None
+            if key is None or not proxy.get("name"):
+                self.result.invalid += 1
+                continue
+
+            name = self.by_identity.get(key)
+            if name is None:
+                name = self._claim_name(str(proxy["name"]), source)
+                self.by_identity[key] = name
+                self.proxies.append({**proxy, "name": name})
+            else:
+                self.result.duplicates += 1
+            if name not in listed:
+                listed.add(name)
+                members.append(name)
+
+    def _claim_name(self, name: str, source: str) -> str:
+        candidate = name
+        if candidate in self.taken:
+            self.result.renamed += 1
+            candidate = f"{name} ({source})"
+            counter = 2
+            while candidate in self.taken:
+                candidate = f"{name} ({source} {counter})"
+                counter += 1
+        self.taken.add(candidate)
+        return candidate
+
+    def groups(self) -> List[Dict]:
+        """A selector over everything, a url-test group, and one selector per source."""
+        names = [proxy["name"] for proxy in self.proxies]
+        sources = [source for source in self.source_names if self.source_members[source]]
+        groups: List[Dict] = [
+            {"name": SELECT_GROUP, "type": "select", "proxies": [AUTO_GROUP, *sources, "DIRECT"]},
+            {
+                "name": AUTO_GROUP,
+                "type": "url-test",
+                "url": AUTO_TEST_URL,
+                "interval": AUTO_TEST_INTERVAL,
+                "proxies": names,
+            },
+        ]
+        groups.extend({"name": source, "type": "select", "proxies": self.source_members[source]} for source in sources)
+        return groups
+
+    def rules(self, targets: Set[str]) -> List[str]:
+        """The base source's rules, with policies not in ``targets`` sent to ``SELECT_GROUP``."""
+        rules = [rule for rule in self.base.get("rules") or [] if isinstance(rule, str)]
+        if not rules:
+            return [f"MATCH,{SELECT_GROUP}"]
+        return [retarget_rule(rule, targets, SELECT_GROUP) for rule in rules]
+
+    def document(self) -> Dict:
+        """The merged profile: base settings from the first source, merged nodes and groups."""
+        if not self.proxies:
+            # An empty url-test group is rejected by the core.
+            raise ValueError("没有可合并的有效节点")
+        groups = self.groups()
+        targets = {group["name"] for group in groups}
+        targets.update(proxy["name"] for proxy in self.proxies)
+        merged = {key: value for key, value in self.base.items() if key not in REBUILT_KEYS}
+        merged["proxies"] = self.proxies
+        merged["proxy-groups"] = groups
+        merged["rules"] = self.rules(targets)
+        self.result.kept = len(self.proxies)
+        return merged
+
+
+def merge_files(sources: List[Tuple[str, Path]], output: Path) -> MergeResult:
+    """Merge ``(name, yaml path)`` sources into ``output``, written atomically."""
+    merger = SubscriptionMerger(name for name, _ in sources)
+    for name, path in sources:
+        with open(path, "rb") as handle:
+            document = load_yaml(handle)
+        if not isinstance(document, dict):
+            raise ValueError(f"{name}: 不是有效的 YAML 对象")
+        merger.add_source(name, document)
+
+    merged = merger.document()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = output.with_name(f"{output.name}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        dump_yaml(merged, handle)
+    os.replace(temp_path, output)
+    return merger.result
@@ -0,0 +1,65 @@
+"""Per-subscription metadata persisted alongside the downloaded YAML files."""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict
+
+METADATA_FILENAME = "metadata.json"
+METADATA_VERSION = 1
+
+
+class SubscriptionMetadata:
+    """Small JSON store keyed by subscription name.
+
+    Records hold HTTP validators (``etag`` / ``last_modified``) and the
+    content hash of the cached YAML. Writes go through a temp file and
+    ``os.replace`` so a crash never leaves a truncated store behind.
+    """
+
+    def __init__(self, work_dir: Path):
+        self.path = Path(work_dir) / METADATA_FILENAME
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != METADATA_VERSION:
+            return {}
+        records = data.get("subscriptions", {})
+        return records if isinstance(records, dict) else {}
+
+    def _save(self) -> None:
+        payload = {"version": METADATA_VERSION, "subscriptions": self._records}
+        temp_path = self.path.with_suffix(".json.tmp")
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def get(self, name: str) -> Dict:
+        """Return a copy of the record for ``name`` (empty if unknown)."""
+        with self._lock:
+            return dict(self._records.get(name, {}))
+
+    def update(self, name: str, **fields) -> Dict:
+        """Merge ``fields`` into the record for ``name`` and persist."""
+        with self._lock:
+            record = self._records.setdefault(name, {})
+            record.update(fields)
+            self._save()
+            return dict(record)
+
+    def remove(self, name: str) -> None:
+        """Forget everything recorded for ``name``."""
+        with self._lock:
+            if self._records.pop(name, None) is not None:
+                self._save()
@@ -0,0 +1,122 @@
+"""Compact node and group model built from the controller's ``/proxies``.
+
+Subscription files are validated by streaming them through
+``scan_subscription`` instead, so no per-node objects are kept there.
+"""
+
+from __future__ import annotations
+
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BUILTIN_PROXIES = ("DIRECT", "REJECT", "GLOBAL")
+# Members a group may list that are not real choices.
+PSEUDO_MEMBERS = ("DIRECT", "REJECT")
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _last_delay(info: Dict) -> int:
+    history = info.get("history") or []
+    return int(history[-1].get("delay", 0) or 0) if history else 0
+
+
+class ProxyNode:
+    """A leaf proxy; ``delay`` is the controller's last result (0 = none)."""
+
+    __slots__ = ("name", "type", "server", "port", "udp", "delay")
+
+    def __init__(
+        self,
+        name: str,
+        type: Optional[str] = None,
+        server: Optional[str] = None,
+        port: Optional[int] = None,
+        udp: bool = False,
+        delay: int = 0,
+    ):
+        self.name = sys.intern(name)
+        self.type = _intern(type) or "unknown"
+        self.server = server
+        self.port = port
+        self.udp = udp
+        self.delay = delay
+
+    def __repr__(self) -> str:
+        return f"ProxyNode({self.name!r}, {self.type!r})"
+
+
+class ProxyGroup:
+    """A strategy group; ``members`` keep the configured order."""
+
+    __slots__ = ("name", "type", "now", "members", "delay")
+
+    def __init__(
+        self,
+        name: str,
+        type: Optional[str] = None,
+        members: Iterable[str] = (),
+        now: str = "",
+        delay: int = 0,
+    ):
+        self.name = sys.intern(name)
+        self.type = _intern(type) or "unknown"
+        self.members: Tuple[str, ...] = tuple(sys.intern(member) for member in members)
+        self.now = _intern(now) or ""
+        self.delay = delay
+
+    def choices(self) -> List[str]:
+        """Selectable members, without DIRECT/REJECT."""
+        return [name for name in self.members if name not in PSEUDO_MEMBERS]
+
+    def __repr__(self) -> str:
+        return f"ProxyGroup({self.name!r}, {self.type!r}, {len(self.members)} members)"
+
+
+class ProxyCatalog:
+    """Nodes and groups indexed by name, plus a node -> groups reverse map.
+
+    Names are interned, so a node that appears in many groups is stored
+    once however many member tuples reference it.
+    """
+
+    def __init__(self) -> None:
+        self.nodes: Dict[str, ProxyNode] = {}
+        self.groups: Dict[str, ProxyGroup] = {}
+        self.node_groups: Dict[str, List[str]] = {}
+
+    @classmethod
+    def from_controller(cls, proxies: Dict[str, Dict]) -> "ProxyCatalog":
+        """Build from the ``proxies`` mapping of the controller's ``/proxies``."""
+        catalog = cls()
+        for name, info in proxies.items():
+            if "all" in info:
+                if name != "GLOBAL":
+                    catalog.add_group(
+                        ProxyGroup(name, info.get("type"), info["all"], info.get("now", ""), _last_delay(info))
+                    )
+            elif name not in BUILTIN_PROXIES:
+                catalog.add_node(
+                    ProxyNode(name, info.get("type"), udp=bool(info.get("udp")), delay=_last_delay(info))
+                )
+        return catalog
+
+    def add_node(self, node: ProxyNode) -> None:
+        self.nodes.setdefault(node.name, node)
+
+    def add_group(self, group: ProxyGroup) -> None:
+        self.groups[group.name] = group
+        for member in group.members:
+            self.node_groups.setdefault(member, []).append(group.name)
+
+    def members(self, group_name: str) -> List[str]:
+        """Selectable members of a group (empty if the group is unknown)."""
+        group = self.groups.get(group_name)
+        return group.choices() if group is not None else []
+
+    def delay_of(self, name: str) -> int:
+        """Last known delay of a node or group (0 if unknown)."""
+        item = self.nodes.get(name) or self.groups.get(name)
+        return item.delay if item is not None else 0
@@ -0,0 +1,96 @@
+"""Indexed, change-aware view of Clash Party's ``profile.yaml``."""
+
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .yaml_utils import dump_yaml, load_yaml
+
+
+class PartyProfileIndex:
+    """Load ``profile.yaml`` once and look items up by URL or id.
+
+    The parsed document is cached together with the file's mtime and size;
+    any lookup first stats the file and re-parses only when either changed,
+    so repeated syncs, imports and listings in one process share one parse.
+    """
+
+    def __init__(self, party_dir: Path):
+        self.path = Path(party_dir) / "profile.yaml"
+        self._lock = threading.RLock()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._data: Dict = {}
+        self._by_url: Dict[str, Dict] = {}
+        self._by_id: Dict[str, Dict] = {}
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _stat_signature(self) -> Tuple[int, int]:
+        stat = self.path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self) -> None:
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return
+        with open(self.path, "rb") as handle:
+            data = load_yaml(handle) or {}
+        self._rebuild(data)
+        self._signature = signature
+
+    def _rebuild(self, data: Dict) -> None:
+        self._data = data
+        self._by_url = {}
+        self._by_id = {}
+        for item in data.get("items") or []:
+            if item.get("url"):
+                self._by_url.setdefault(item["url"], item)
+            if item.get("id") is not None:
+                self._by_id.setdefault(item["id"], item)
+
+    def items(self) -> List[Dict]:
+        """Return the profile items (raises if profile.yaml is missing)."""
+        with self._lock:
+            self._refresh()
+            return list(self._data.get("items") or [])
+
+    def by_url(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            self._refresh()
+            return self._by_url.get(url)
+
+    def by_id(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._refresh()
+            return self._by_id.get(profile_id)
+
+    @property
+    def current(self) -> Optional[str]:
+        with self._lock:
+            self._refresh()
+            return self._data.get("current")
+
+    def mark_updated(self, stamps: Dict[str, int]) -> Dict:
+        """Set ``updated`` (ms) on the given profile ids and save once."""
+        with self._lock:
+            self._refresh()
+            for profile_id, updated_at in stamps.items():
+                item = self._by_id.get(profile_id)
+                if item is not None:
+                    item["updated"] = updated_at
+            self.save(self._data)
+            return self._data
+
+    def save(self, data: Dict) -> None:
+        """Replace profile.yaml atomically and keep the index in sync."""
+        with self._lock:
+            temp_file = self.path.with_name(f".{self.path.name}.tmp")
+            with open(temp_file, "w", encoding="utf-8") as handle:
+                dump_yaml(data, handle)
+            os.replace(temp_file, self.path)
+            self._rebuild(data)
+            self._signature = self._stat_signature()
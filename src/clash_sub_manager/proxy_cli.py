@@ -6,9 +6,27 @@ import argparse
 import sys
 from pathlib import Path
 
-from .config import default_config_display, read_api_from_config, resolve_config_path
+from .auto_select import AutoSelector
+from .config import (
+    default_config_display,
+    read_api_from_config,
+    read_config_data,
+    resolve_config_path,
+    resolve_work_dir,
+    write_config_data,
+)
 from .console import Colors
-from .proxy_selector import ClashProxySelector
+from .http_client import get_client
+from .latency import LatencyStore
+from .search import SEARCH_INDEX_FILENAME
+from .throughput import DEFAULT_MAX_MB, DEFAULT_SPEED_LIMIT, DEFAULT_SPEED_TIMEOUT, SpeedTester, lanes_from_config
+from .proxy_selector import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_SNAPSHOT_TTL,
+    DEFAULT_TOP_N,
+    ClashAPIError,
+    ClashProxySelector,
+)
 
 
 def build_parser(default_config: str) -> argparse.ArgumentParser:
@@ -19,9 +37,20 @@ def build_parser(default_config: str) -> argparse.ArgumentParser:
 示例:
   clash-proxy groups              # 查看策略组
   clash-proxy nodes               # 查看所有节点
+  clash-proxy nodes --stats       # 按历史表现排序查看节点
   clash-proxy current             # 查看当前选择
   clash-proxy test                # 测试所有节点延迟
+  clash-proxy test -c 32          # 32 路并发测试
+  clash-proxy test --group PROXY  # 通过策略组批量接口测试
+  clash-proxy test --top 3 --max-delay 200   # 找到 3 个 200ms 内的节点即停止
+  clash-proxy speed               # 对历史延迟最好的 5 个节点做下载测速
+  clash-proxy speed hk jp         # 对匹配的香港、日本节点做下载测速
   clash-proxy switch PROXY HK01   # 切换节点
+  clash-proxy switch PROXY hk     # 模糊匹配，切换到最佳匹配的香港节点
+  clash-proxy find 日本           # 搜索节点并显示延迟
+  clash-proxy auto PROXY          # 自动保持 PROXY 组在最佳节点
+  clash-proxy save work           # 保存当前各策略组的选择为 work
+  clash-proxy apply work          # 一次性并发恢复 work 中的所有选择
         """,
     )
 
@@ -31,13 +60,60 @@ def build_parser(default_config: str) -> argparse.ArgumentParser:
 
     subparsers = parser.add_subparsers(dest="command", help="可用命令")
     subparsers.add_parser("groups", help="查看策略组")
-    subparsers.add_parser("nodes", help="查看所有节点")
+    nodes_parser = subparsers.add_parser("nodes", help="查看所有节点")
+    nodes_parser.add_argument("--stats", action="store_true", help="显示历史延迟统计 (P50/P95/丢包率/EWMA)")
     subparsers.add_parser("current", help="查看当前选择")
-    subparsers.add_parser("test", help="测试所有节点延迟")
+    test_parser = subparsers.add_parser("test", help="测试所有节点延迟")
+    test_parser.add_argument(
+        "--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"并发测试数量 (默认: {DEFAULT_CONCURRENCY})",
+    )
+    test_parser.add_argument("--group", "-g", action="append", help="仅测试指定策略组 (可重复，使用批量延迟接口)")
+    test_parser.add_argument("--all-groups", action="store_true", help="逐个策略组批量测试")
+    test_parser.add_argument("--top", type=int, metavar="K", help="找到 K 个满足条件的节点后立即停止")
+    test_parser.add_argument("--max-delay", type=int, metavar="MS", help="与 --top 搭配，仅接受延迟不超过 MS 的节点")
+    test_parser.add_argument("--limit", type=int, default=DEFAULT_TOP_N, help=f"显示最快的前 N 个节点 (默认: {DEFAULT_TOP_N})")
+
+    speed_parser = subparsers.add_parser("speed", help="通过代理端口下载测速 (Mbps / 首字节时间)")
+    speed_parser.add_argument("nodes", nargs="*", help="节点名称或关键字 (省略则取历史延迟最好的节点)")
+    speed_parser.add_argument("--limit", type=int, help=f"最多测试 N 个节点 (默认: {DEFAULT_SPEED_LIMIT})")
+    speed_parser.add_argument("--group", help="测速用的 Selector 策略组 (默认: speed.group 或 SpeedTest)")
+    speed_parser.add_argument("--url", help="测速下载地址 (默认: speed.url)")
+    speed_parser.add_argument("--proxy", help="代理地址，如 http://127.0.0.1:7890 (默认从 /configs 读取 mixed-port)")
+    speed_parser.add_argument("--timeout", type=float, help=f"单个节点的下载时长上限秒数 (默认: {DEFAULT_SPEED_TIMEOUT:g})")
+    speed_parser.add_argument("--max-mb", type=float, help=f"单个节点最多下载的 MB 数 (默认: {DEFAULT_MAX_MB})")
+
+    auto_parser = subparsers.add_parser("auto", help="持续测试并自动切换到最佳节点")
+    auto_parser.add_argument("group", help="策略组名称 (需为 Selector 类型)")
+    auto_parser.add_argument("--interval", type=float, help="每轮间隔秒数 (默认: 30)")
+    auto_parser.add_argument("--margin", type=float, help="候选节点需领先的 EWMA 毫秒数 (默认: 50)")
+    auto_parser.add_argument("--sustain", type=int, help="候选需连续领先的轮数 (默认: 3)")
+    auto_parser.add_argument("--dwell", type=float, help="两次切换之间的最短驻留秒数 (默认: 300)")
+    auto_parser.add_argument("--batch", type=int, help="每轮测试的候选节点数 (默认: 8)")
+    auto_parser.add_argument("--timeout", type=int, help="单次探测超时毫秒数 (默认: 3000)")
+    auto_parser.add_argument("--url", help="测试 URL (默认: http://www.gstatic.com/generate_204)")
+    auto_parser.add_argument("--rounds", type=int, help="运行指定轮数后退出 (默认: 持续运行)")
 
     switch_parser = subparsers.add_parser("switch", help="切换节点")
-    switch_parser.add_argument("group", help="策略组名称")
-    switch_parser.add_argument("node", help="节点名称")
+    switch_parser.add_argument("group", help="策略组名称 (支持模糊匹配)")
+    switch_parser.add_argument("node", help="节点名称或关键字 (如 hk、日本、us 02)")
+    switch_parser.add_argument("--fastest", action="store_true", help="在所有匹配节点中选择延迟最低的")
+
+    save_parser = subparsers.add_parser("save", help="保存当前选择为命名方案")
+    save_parser.add_argument("profile", help="方案名称")
+    save_parser.add_argument("--group", "-g", action="append", help="仅保存指定策略组 (可重复，默认所有 Selector 组)")
+
+    apply_parser = subparsers.add_parser("apply", help="应用命名方案中的所有选择")
+    apply_parser.add_argument("profile", nargs="?", help="方案名称 (省略则列出已保存的方案)")
+    apply_parser.add_argument(
+        "--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY,
+        help=f"并发切换数量 (默认: {DEFAULT_CONCURRENCY})",
+    )
+
+    find_parser = subparsers.add_parser("find", help="模糊搜索节点与策略组")
+    find_parser.add_argument("query", help="关键字，支持国旗代码 (hk/jp/us)、中文与编号")
+    find_parser.add_argument("--group", "-g", help="仅在指定策略组内搜索")
+    find_parser.add_argument("--limit", type=int, default=DEFAULT_TOP_N, help=f"最多显示 N 个结果 (默认: {DEFAULT_TOP_N})")
 
     return parser
 
@@ -58,6 +134,7 @@ def main(argv: list[str] | None = None) -> int:
 
     try:
         file_api, file_secret = read_api_from_config(config_path)
+        config_data = read_config_data(config_path)
     except Exception as exc:
         print(f"{Colors.RED}✗ 读取 API 配置失败: {exc}{Colors.NC}")
         return 1
@@ -65,19 +142,85 @@ def main(argv: list[str] | None = None) -> int:
     api_url = args.api or file_api
     secret = args.secret if args.secret is not None else file_secret
 
-    selector = ClashProxySelector(api_url=api_url, secret=secret)
+    work_dir = resolve_work_dir(config_data, config_path)
+    latency_cfg = config_data.get("latency", {}) or {}
+    latency = LatencyStore.in_dir(
+        work_dir,
+        **{key: latency_cfg[key] for key in ("capacity", "alpha") if key in latency_cfg},
+    )
+    selector = ClashProxySelector(
+        api_url=api_url,
+        secret=secret,
+        http=get_client(config_data.get("http")),
+        latency=latency,
+        snapshot_ttl=float(config_data.get("api", {}).get("snapshot_ttl", DEFAULT_SNAPSHOT_TTL)),
+        search_path=work_dir / SEARCH_INDEX_FILENAME,
+    )
 
     try:
         if args.command == "groups":
             selector.list_proxy_groups()
         elif args.command == "nodes":
-            selector.list_all_nodes()
+            selector.list_all_nodes(with_stats=args.stats)
         elif args.command == "current":
             selector.get_current_selections()
         elif args.command == "test":
-            selector.test_all_delays()
+            if args.top:
+                selector.test_top(args.top, args.max_delay, concurrency=args.concurrency)
+            elif args.group or args.all_groups:
+                selector.test_groups(args.group, concurrency=args.concurrency, limit=args.limit)
+            else:
+                selector.test_all_delays(concurrency=args.concurrency, limit=args.limit)
+        elif args.command == "speed":
+            speed_cfg = config_data.get("speed", {}) or {}
+            tester = SpeedTester(
+                selector,
+                proxy_url=args.proxy or speed_cfg.get("proxy") or selector.mixed_proxy_url(),
+                lanes=lanes_from_config(speed_cfg, group=args.group, url=args.url),
+                timeout=args.timeout or speed_cfg.get("timeout", DEFAULT_SPEED_TIMEOUT),
+                max_bytes=int((args.max_mb or speed_cfg.get("max_mb", DEFAULT_MAX_MB)) * 1024 * 1024),
+            )
+            if not tester.run(args.nodes, limit=args.limit or speed_cfg.get("limit", DEFAULT_SPEED_LIMIT)):
+                return 1
+        elif args.command == "auto":
+            auto_cfg = config_data.get("auto", {}) or {}
+            options = {
+                key: getattr(args, key) if getattr(args, key) is not None else auto_cfg.get(key)
+                for key in ("interval", "margin", "sustain", "dwell", "batch", "timeout")
+            }
+            options["test_url"] = args.url or auto_cfg.get("test_url")
+            options = {key: value for key, value in options.items() if value is not None}
+            AutoSelector(selector, args.group, **options).run(rounds=args.rounds)
         elif args.command == "switch":
-            selector.switch_proxy(args.group, args.node)
+            if not selector.switch_matching(args.group, args.node, fastest=args.fastest):
+                return 1
+        elif args.command == "save":
+            layout = selector.current_layout(args.group)
+            if not layout:
+                print(f"{Colors.YELLOW}没有可保存的选择{Colors.NC}")
+                return 1
+            config_data.setdefault("selections", {})[args.profile] = layout
+            write_config_data(config_path, config_data)
+            print(f"{Colors.GREEN}✓ 已保存方案 {args.profile} ({len(layout)} 个策略组){Colors.NC}")
+            for group_name, proxy_name in layout.items():
+                print(f"  {group_name:20s} → {proxy_name}")
+        elif args.command == "apply":
+            profiles = config_data.get("selections", {}) or {}
+            if not args.profile or args.profile not in profiles:
+                if args.profile:
+                    print(f"{Colors.RED}✗ 方案不存在: {args.profile}{Colors.NC}")
+                names = ", ".join(profiles) if profiles else "无"
+                print(f"已保存的方案: {names}")
+                return 1 if args.profile else 0
+            print(f"{Colors.CYAN}应用方案: {args.profile}{Colors.NC}")
+            if not selector.apply_layout(profiles[args.profile], concurrency=args.concurrency):
+                return 1
+        elif args.command == "find":
+            selector.find(args.query, group_name=args.group, limit=args.limit)
+    except ClashAPIError as exc:
+        print(f"{Colors.RED}✗ 无法连接到 Clash API: {exc}{Colors.NC}")
+        print(f"{Colors.YELLOW}提示：请确保 Clash 正在运行且 API 已启用{Colors.NC}")
+        return 1
     except KeyboardInterrupt:
         print(f"\n{Colors.YELLOW}操作已取消{Colors.NC}")
         return 1
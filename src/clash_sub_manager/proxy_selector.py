@@ -2,54 +2,116 @@
 
 from __future__ import annotations
 
-import sys
-from typing import Dict, List, Optional, Tuple
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
 
 import requests
 
 from .console import Colors
+from .http_client import HttpClient, get_client
+from .latency import LatencyStore, NodeStats, adaptive_timeout
+from .models import ProxyNode
+from .search import KIND_GROUP, SearchIndex, SearchMatch
+from .snapshot import ProxySnapshot
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_TOP_N = 20
+DEFAULT_TEST_URL = "http://www.gstatic.com/generate_204"
+# Seconds a /proxies fetch is reused; keeps one CLI call to a single fetch.
+DEFAULT_SNAPSHOT_TTL = 5.0
+
+
+class ClashAPIError(Exception):
+    """Raised when the Clash controller cannot be reached or answers badly."""
 
 
 class ClashProxySelector:
     """Interact with Clash proxy groups and nodes via the REST API."""
 
-    def __init__(self, api_url: str, secret: Optional[str] = None):
+    def __init__(
+        self,
+        api_url: str,
+        secret: Optional[str] = None,
+        http: Optional[HttpClient] = None,
+        latency: Optional[LatencyStore] = None,
+        snapshot_ttl: float = DEFAULT_SNAPSHOT_TTL,
+        search_path: Optional[Path] = None,
+    ):
         self.api_url = api_url.rstrip("/")
         self.secret = secret or ""
         self.headers = {"Authorization": f"Bearer {self.secret}"} if self.secret else {}
-
-    def get_proxies(self) -> Dict:
-        """Fetch proxies dict from Clash."""
+        self.http = http or get_client()
+        self._group_delay_supported: Optional[bool] = None
+        # Whether the last measure_group_delays call used the batch endpoint.
+        self._last_group_batched = False
+        self.latency = latency
+        self.snapshot_ttl = snapshot_ttl
+        self._snapshot: Optional[ProxySnapshot] = None
+        self._snapshot_lock = threading.Lock()
+        self.search_path = search_path
+        self._search: Optional[Tuple[ProxySnapshot, SearchIndex]] = None
+
+    def snapshot(self, force: bool = False) -> ProxySnapshot:
+        """Return the cached ``/proxies`` snapshot, refetching once it is stale.
+
+        Raises ``ClashAPIError`` if the controller cannot be queried.
+        """
+        with self._snapshot_lock:
+            cached = self._snapshot
+            if not force and cached is not None and cached.age() < self.snapshot_ttl:
+                return cached
+            try:
+                response = self.http.get(f"{self.api_url}/proxies", "proxies", headers=self.headers)
+                response.raise_for_status()
+                proxies = response.json().get("proxies", {})
+            except (requests.exceptions.RequestException, ValueError) as exc:
+                raise ClashAPIError(str(exc)) from exc
+            self._snapshot = ProxySnapshot.from_controller(proxies)
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        """Drop the cached snapshot so the next query refetches."""
+        with self._snapshot_lock:
+            self._snapshot = None
+
+    def mixed_proxy_url(self) -> str:
+        """``http://host:port`` of the core's mixed (or HTTP) inbound, from ``/configs``."""
         try:
-            response = requests.get(f"{self.api_url}/proxies", headers=self.headers, timeout=5)
+            response = self.http.get(f"{self.api_url}/configs", "configs", headers=self.headers)
             response.raise_for_status()
-            return response.json().get("proxies", {})
-        except requests.exceptions.RequestException as exc:
-            print(f"{Colors.RED}✗ 无法连接到 Clash API: {exc}{Colors.NC}")
-            print(f"{Colors.YELLOW}提示：请确保 Clash 正在运行且 API 已启用{Colors.NC}")
-            sys.exit(1)
+            configs = response.json()
+        except (requests.exceptions.RequestException, ValueError) as exc:
+            raise ClashAPIError(str(exc)) from exc
+        port = configs.get("mixed-port") or configs.get("port")
+        if not port:
+            raise ClashAPIError("Clash 未开启 mixed-port/port，无法通过代理端口测速")
+        host = urlsplit(self.api_url).hostname or "127.0.0.1"
+        return f"http://{host}:{port}"
+
+    def get_proxies(self) -> Dict:
+        """Fetch proxies dict from Clash (served from the snapshot cache)."""
+        return self.snapshot().proxies
 
     def list_proxy_groups(self) -> None:
         """Print all strategy groups and their members."""
-        proxies = self.get_proxies()
+        groups = self.snapshot().groups
 
         print(f"\n{Colors.CYAN}{'='*70}{Colors.NC}")
         print(f"{Colors.CYAN}Clash 代理策略组{Colors.NC}")
         print(f"{Colors.CYAN}{'='*70}{Colors.NC}\n")
 
-        groups = {name: info for name, info in proxies.items() if "all" in info and name != "GLOBAL"}
-
         if not groups:
             print(f"{Colors.YELLOW}没有找到策略组{Colors.NC}")
             return
 
-        for group_name, group_info in groups.items():
-            group_type = group_info.get("type", "unknown")
-            current = group_info.get("now", "")
-            all_proxies = group_info.get("all", [])
+        for group_name, group in groups.items():
+            all_proxies = group.members
 
-            print(f"📦 {Colors.BLUE}{group_name}{Colors.NC} ({group_type})")
-            print(f"   当前选择: {Colors.GREEN}{current}{Colors.NC}")
+            print(f"📦 {Colors.BLUE}{group_name}{Colors.NC} ({group.type})")
+            print(f"   当前选择: {Colors.GREEN}{group.now}{Colors.NC}")
             print(f"   可用节点: {len(all_proxies)} 个")
 
             if all_proxies:
@@ -59,35 +121,54 @@ class ClashProxySelector:
                     print(f"   ... 还有 {len(all_proxies) - 5} 个节点")
             print()
 
-    def list_all_nodes(self) -> None:
+    def list_all_nodes(self, with_stats: bool = False) -> None:
         """Print all available nodes and their last latency measurement."""
-        proxies = self.get_proxies()
+        nodes = self.snapshot().nodes
 
         print(f"\n{Colors.CYAN}{'='*70}{Colors.NC}")
         print(f"{Colors.CYAN}所有可用节点{Colors.NC}")
         print(f"{Colors.CYAN}{'='*70}{Colors.NC}\n")
 
-        nodes = {
-            name: info
-            for name, info in proxies.items()
-            if "all" not in info and name not in ["DIRECT", "REJECT", "GLOBAL"]
-        }
-
         if not nodes:
             print(f"{Colors.YELLOW}没有找到节点{Colors.NC}")
             return
 
-        for index, (node_name, node_info) in enumerate(nodes.items(), 1):
-            delay_str = format_delay(node_info.get("history", []))
-            node_type = node_info.get("type", "unknown")
-            print(f"{index:3d}. {Colors.BLUE}{node_name}{Colors.NC} [{node_type}] - 延迟: {delay_str}")
+        if with_stats:
+            self._print_node_stats(nodes)
+            return
+
+        for index, node in enumerate(nodes.values(), 1):
+            print(f"{index:3d}. {Colors.BLUE}{node.name}{Colors.NC} [{node.type}] - 延迟: {human_delay(node.delay)}")
+
+    def _print_node_stats(self, nodes: Dict[str, ProxyNode]) -> None:
+        if self.latency is None:
+            print(f"{Colors.YELLOW}未启用延迟历史记录{Colors.NC}")
+            return
+
+        ranked = self.latency.ranked(nodes)
+        print(f"{'':5s}{'节点':40s} {'P50':>7s} {'P95':>7s} {'丢包':>6s} {'EWMA':>7s} {'样本':>5s} {'速度':>10s}")
+        for index, stats in enumerate(ranked, 1):
+            speed = self.latency.speed(stats.name)
+            speed_str = f"{speed['ewma']:.1f} Mbps" if speed else "-"
+            print(f"{index:3d}. {Colors.BLUE}{stats.name:40s}{Colors.NC} {format_stats(stats)} {speed_str:>10s}")
 
-    def test_delay(self, proxy_name: str, timeout: int = 5000) -> Optional[int]:
+        untested = len(nodes) - len(ranked)
+        if untested:
+            print(f"\n{Colors.YELLOW}{untested} 个节点暂无历史记录，运行 clash-proxy test 进行测试{Colors.NC}")
+
+    def record_delays(self, results: Dict[str, Optional[int]]) -> None:
+        """Add probe results to the latency history, if one is attached."""
+        if self.latency is not None and results:
+            self.latency.record_many(results)
+            self.latency.save()
+
+    def test_delay(self, proxy_name: str, timeout: int = 5000, url: Optional[str] = None) -> Optional[int]:
         """Test a node delay value."""
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.api_url}/proxies/{proxy_name}/delay",
-                params={"timeout": timeout, "url": "http://www.gstatic.com/generate_204"},
+                "delay",
+                params={"timeout": timeout, "url": url or DEFAULT_TEST_URL},
                 headers=self.headers,
                 timeout=timeout / 1000 + 1,
             )
@@ -96,82 +177,439 @@ class ClashProxySelector:
         except Exception:
             return None
 
-    def test_all_delays(self) -> None:
-        """Test every available node and print the fastest ones."""
-        proxies = self.get_proxies()
-        nodes = {
-            name: info
-            for name, info in proxies.items()
-            if "all" not in info and name not in ["DIRECT", "REJECT", "GLOBAL"]
-        }
+    def test_group_delay(self, group_name: str, timeout: int = 5000) -> Optional[Dict[str, int]]:
+        """Test all members of a group in one call to ``/group/{name}/delay``.
+
+        Returns ``{member: delay}`` for members that answered, or None when
+        the call failed or the controller lacks the endpoint (the latter is
+        remembered for later calls).
+        """
+        if self._group_delay_supported is False:
+            return None
+        try:
+            response = self.http.get(
+                f"{self.api_url}/group/{quote(group_name, safe='')}/delay",
+                "delay",
+                params={"timeout": timeout, "url": DEFAULT_TEST_URL},
+                headers=self.headers,
+                timeout=timeout / 1000 + 5,
+            )
+        except requests.exceptions.RequestException:
+            return None
+        if response.status_code in (404, 405):
+            self._group_delay_supported = False
+            return None
+        if response.status_code >= 400:
+            # A failed batch says nothing about individual members.
+            return None
+        try:
+            data = response.json() or {}
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        self._group_delay_supported = True
+        return {name: delay for name, delay in data.items() if isinstance(delay, int) and delay > 0}
+
+    def measure_group_delays(
+        self,
+        group_name: str,
+        members: List[str],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: int = 5000,
+    ) -> Dict[str, Optional[int]]:
+        """Batch-test a group, falling back to per-node probes if unsupported."""
+        batch = self.test_group_delay(group_name, timeout)
+        self._last_group_batched = batch is not None
+        if batch is None:
+            progress = ProgressLine(len(members))
+            results = self.measure_delays(members, concurrency, timeout, on_result=progress.update)
+            progress.finish()
+        else:
+            results = {name: batch.get(name) for name in members}
+        self.record_delays(results)
+        return results
+
+    def test_groups(
+        self,
+        group_names: Optional[List[str]] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        limit: int = DEFAULT_TOP_N,
+    ) -> None:
+        """Test one or all groups group-by-group and print each ranking."""
+        groups = self.snapshot().groups
+
+        if group_names:
+            missing = [name for name in group_names if name not in groups]
+            for name in missing:
+                print(f"{Colors.RED}✗ 策略组不存在: {name}{Colors.NC}")
+            groups = {name: groups[name] for name in group_names if name in groups}
+
+        if not groups:
+            print(f"{Colors.YELLOW}没有找到策略组{Colors.NC}")
+            return
+
+        for group_name, group in groups.items():
+            members = group.choices()
+            print(f"\n{Colors.CYAN}{'='*70}{Colors.NC}")
+            print(f"{Colors.CYAN}测试策略组: {group_name} ({len(members)} 个节点){Colors.NC}")
+            print(f"{Colors.CYAN}{'='*70}{Colors.NC}")
+
+            delays = self.measure_group_delays(group_name, members, concurrency)
+            mode = "批量接口" if self._last_group_batched else "逐个节点"
+            print(f"{Colors.BLUE}测试方式: {mode}{Colors.NC}")
+
+            results = [(name, delay if delay is not None else 9999) for name, delay in delays.items()]
+            self._print_ranking(results, limit)
+
+    def measure_delays(
+        self,
+        names: Iterable[str],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: int = 5000,
+        on_result: Optional[Callable[[str, Optional[int]], None]] = None,
+        url: Optional[str] = None,
+    ) -> Dict[str, Optional[int]]:
+        """Probe ``names`` with up to ``concurrency`` requests in flight."""
+        names = list(names)
+        results: Dict[str, Optional[int]] = {}
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {pool.submit(self.test_delay, name, timeout, url): name for name in names}
+            for future in as_completed(futures):
+                name = futures[future]
+                results[name] = future.result()
+                if on_result is not None:
+                    on_result(name, results[name])
+        return results
+
+    def find_good_nodes(
+        self,
+        names: List[str],
+        count: int,
+        max_delay: Optional[int] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: int = 5000,
+        on_result: Optional[Callable[[str, Optional[int]], None]] = None,
+    ) -> Tuple[List[Tuple[str, int]], int]:
+        """Probe best-known nodes first and stop once ``count`` qualify.
+
+        Only ``concurrency`` probes are ever in flight; once enough nodes
+        answer under ``max_delay`` the queued ones are cancelled. Each
+        probe's timeout comes from the node's history and is capped by
+        ``max_delay``, since a slower answer could not qualify anyway.
+        Returns the qualifying ``(name, delay)`` pairs and the probe count.
+        """
+        if self.latency is not None:
+            names = self.latency.probe_order(names)
+
+        def probe_timeout(name: str) -> int:
+            stats = self.latency.stats(name) if self.latency is not None else None
+            limit = adaptive_timeout(stats, timeout)
+            return min(limit, max_delay) if max_delay else limit
+
+        queue = iter(names)
+        found: List[Tuple[str, int]] = []
+        results: Dict[str, Optional[int]] = {}
+        pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        pending: Dict[Future, str] = {}
+
+        def submit_next() -> None:
+            name = next(queue, None)
+            if name is not None:
+                pending[pool.submit(self.test_delay, name, probe_timeout(name))] = name
 
+        try:
+            for _ in range(max(1, concurrency)):
+                submit_next()
+            while pending and len(found) < count:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    delay = future.result()
+                    results[name] = delay
+                    if on_result is not None:
+                        on_result(name, delay)
+                    if delay and (not max_delay or delay <= max_delay):
+                        found.append((name, delay))
+                    if len(found) < count:
+                        submit_next()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        self.record_delays(results)
+        found.sort(key=lambda item: item[1])
+        return found[:count], len(results)
+
+    def test_top(
+        self,
+        count: int,
+        max_delay: Optional[int] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ) -> None:
+        """Print the first ``count`` nodes answering under ``max_delay``."""
+        nodes = list(self.snapshot().nodes)
+
+        limit = f" ≤ {max_delay}ms" if max_delay else ""
         print(f"\n{Colors.CYAN}{'='*70}{Colors.NC}")
-        print(f"{Colors.CYAN}测试节点延迟{Colors.NC}")
+        print(f"{Colors.CYAN}寻找 {count} 个可用节点{limit}{Colors.NC}")
+        print(f"{Colors.CYAN}{'='*70}{Colors.NC}\n")
+
+        progress = ProgressLine(len(nodes))
+        found, probed = self.find_good_nodes(
+            nodes, count, max_delay, concurrency=concurrency, on_result=progress.update
+        )
+        progress.finish()
+
+        if not found:
+            print(f"{Colors.YELLOW}没有找到符合条件的节点 (已测试 {probed}/{len(nodes)}){Colors.NC}")
+            return
+
+        print(f"{Colors.GREEN}找到 {len(found)} 个节点 (已测试 {probed}/{len(nodes)}){Colors.NC}\n")
+        for idx, (node_name, delay) in enumerate(found, 1):
+            print(f"{idx:3d}. {Colors.BLUE}{node_name:40s}{Colors.NC} {human_delay(delay)}")
+
+    def test_all_delays(self, concurrency: int = DEFAULT_CONCURRENCY, limit: int = DEFAULT_TOP_N) -> None:
+        """Test every available node concurrently and print the fastest ones."""
+        nodes = self.snapshot().nodes
+
+        print(f"\n{Colors.CYAN}{'='*70}{Colors.NC}")
+        print(f"{Colors.CYAN}测试节点延迟 (并发: {concurrency}){Colors.NC}")
         print(f"{Colors.CYAN}{'='*70}{Colors.NC}\n")
 
         total = len(nodes)
-        results: List[Tuple[str, int]] = []
-        for index, node_name in enumerate(nodes.keys(), 1):
-            print(f"[{index}/{total}] 测试 {node_name}...", end="\r")
-            delay = self.test_delay(node_name)
-            results.append((node_name, delay if delay is not None else 9999))
+        progress = ProgressLine(total)
+        delays = self.measure_delays(nodes.keys(), concurrency=concurrency, on_result=progress.update)
+        progress.finish()
+        self.record_delays(delays)
 
+        results: List[Tuple[str, int]] = [
+            (name, delay if delay is not None else 9999) for name, delay in delays.items()
+        ]
+        self._print_ranking(results, limit)
+
+    def _print_ranking(self, results: List[Tuple[str, int]], limit: int = DEFAULT_TOP_N) -> None:
         results.sort(key=lambda item: item[1])
         print(f"\n{Colors.GREEN}测试完成！{Colors.NC}\n")
 
-        for idx, (node_name, delay) in enumerate(results[:20], 1):
+        for idx, (node_name, delay) in enumerate(results[:limit], 1):
             delay_str = human_delay(delay)
             print(f"{idx:3d}. {Colors.BLUE}{node_name:40s}{Colors.NC} {delay_str}")
 
-        if len(results) > 20:
-            print(f"\n... 还有 {len(results) - 20} 个节点")
+        if len(results) > limit:
+            print(f"\n... 还有 {len(results) - limit} 个节点")
+
+    def search_index(self) -> SearchIndex:
+        """Name index for the current snapshot, reusing the on-disk cache."""
+        snap = self.snapshot()
+        if self._search is None or self._search[0] is not snap:
+            self._search = (snap, SearchIndex.for_catalog(snap, self.search_path))
+        return self._search[1]
+
+    def speed_key(self, name: str) -> float:
+        """Sort key for "fastest": EWMA history first, then the controller's last delay."""
+        stats = self.latency.stats(name) if self.latency is not None else None
+        if stats is not None:
+            return stats.score
+        delay = self.snapshot().delay_of(name)
+        return delay if delay else float("inf")
+
+    def resolve_group(self, query: str) -> Optional[str]:
+        """Exact group name, or the best fuzzy match among groups."""
+        snap = self.snapshot()
+        if query in snap.groups:
+            return query
+        matches = self.search_index().search(query, kind=KIND_GROUP)
+        return matches[0].name if matches else None
+
+    def resolve_member(self, group_name: str, query: str, fastest: bool = False) -> Optional[str]:
+        """Exact member name, else the best-scoring match (ties go to the fastest).
+
+        With ``fastest`` every matching member competes on latency alone.
+        """
+        members = self.snapshot().members(group_name)
+        if query in members:
+            return query
+        matches = self.search_index().search(query, within=set(members))
+        if not matches:
+            return None
+        if not fastest:
+            matches = [match for match in matches if match.score == matches[0].score]
+        return min(matches, key=lambda match: self.speed_key(match.name)).name
+
+    def find(self, query: str, group_name: Optional[str] = None, limit: int = DEFAULT_TOP_N) -> None:
+        """Print nodes and groups matching ``query`` with their latency."""
+        within = None
+        if group_name:
+            resolved = self.resolve_group(group_name)
+            if resolved is None:
+                print(f"{Colors.RED}✗ 策略组不存在: {group_name}{Colors.NC}")
+                return
+            group_name = resolved
+            within = set(self.snapshot().members(group_name))
+
+        matches: List[SearchMatch] = self.search_index().search(query, within=within)
+        scope = f" (策略组 {group_name})" if group_name else ""
+        if not matches:
+            print(f"{Colors.YELLOW}没有匹配 \"{query}\" 的节点{scope}{Colors.NC}")
+            return
+
+        snap = self.snapshot()
+        print(f"\n{Colors.CYAN}匹配 \"{query}\"{scope}: {len(matches)} 个{Colors.NC}\n")
+        for idx, match in enumerate(matches[:limit], 1):
+            tag = " [策略组]" if match.kind == KIND_GROUP else ""
+            stats = self.latency.stats(match.name) if self.latency is not None else None
+            ewma = f" (EWMA {stats.score:.0f}ms)" if stats is not None and stats.ewma is not None else ""
+            print(
+                f"{idx:3d}. {Colors.BLUE}{match.name:40s}{Colors.NC} {match.score:4.0%}  "
+                f"{human_delay(snap.delay_of(match.name))}{ewma}{tag}"
+            )
+        if len(matches) > limit:
+            print(f"\n... 还有 {len(matches) - limit} 个匹配")
+
+    def switch_matching(self, group_query: str, node_query: str, fastest: bool = False) -> bool:
+        """``switch_proxy`` with fuzzy group and node names."""
+        group_name = self.resolve_group(group_query)
+        if group_name is None:
+            print(f"{Colors.RED}✗ 策略组不存在: {group_query}{Colors.NC}")
+            return False
+        proxy_name = self.resolve_member(group_name, node_query, fastest=fastest)
+        if proxy_name is None:
+            print(f"{Colors.RED}✗ 策略组 {group_name} 中没有匹配 \"{node_query}\" 的节点{Colors.NC}")
+            return False
+        resolved = [(query, name) for query, name in ((group_query, group_name), (node_query, proxy_name)) if query != name]
+        if resolved:
+            print(f"{Colors.BLUE}匹配: {', '.join(f'{query} → {name}' for query, name in resolved)}{Colors.NC}")
+        return self.switch_proxy(group_name, proxy_name)
+
+    def put_selection(self, group_name: str, proxy_name: str) -> None:
+        """PUT one selection; raises ``requests`` errors to the caller."""
+        response = self.http.put(
+            f"{self.api_url}/proxies/{group_name}",
+            "switch",
+            headers={**self.headers, "Content-Type": "application/json"},
+            json={"name": proxy_name},
+        )
+        response.raise_for_status()
+        snap = self._snapshot
+        if snap is not None:
+            snap.set_selection(group_name, proxy_name)
 
     def switch_proxy(self, group_name: str, proxy_name: str) -> bool:
         """Switch the selection for a given proxy group."""
         try:
-            response = requests.put(
-                f"{self.api_url}/proxies/{group_name}",
-                headers={**self.headers, "Content-Type": "application/json"},
-                json={"name": proxy_name},
-                timeout=5,
-            )
-            response.raise_for_status()
+            self.put_selection(group_name, proxy_name)
             print(f"{Colors.GREEN}✓ 已切换 {group_name} 到 {proxy_name}{Colors.NC}")
             return True
         except requests.exceptions.RequestException as exc:
             print(f"{Colors.RED}✗ 切换失败: {exc}{Colors.NC}")
             return False
 
+    def current_layout(self, group_names: Optional[List[str]] = None) -> Dict[str, str]:
+        """Current ``{group: node}`` of Selector groups (or of ``group_names``)."""
+        groups = self.snapshot().groups
+        if group_names:
+            return {name: groups[name].now for name in group_names if name in groups and groups[name].now}
+        return {name: group.now for name, group in groups.items() if group.type == "Selector" and group.now}
+
+    def apply_layout(self, layout: Dict[str, str], concurrency: int = DEFAULT_CONCURRENCY) -> bool:
+        """Apply ``{group: node}`` with concurrent PUTs and print one line per group.
+
+        Group names must match exactly; a group that no longer exists is
+        skipped rather than guessed. Node names that no longer match are
+        resolved with the fuzzy index, so a layout survives providers
+        renaming their nodes.
+        """
+        snap = self.snapshot()
+        plan: List[Tuple[str, str, str]] = []
+        failed = 0
+        for group_name, node_query in layout.items():
+            if group_name not in snap.groups:
+                print(f"  {Colors.YELLOW}⚠{Colors.NC} {group_name:20s} 策略组不存在，已跳过")
+                failed += 1
+                continue
+            proxy_name = self.resolve_member(group_name, node_query)
+            if proxy_name is None:
+                print(f"  {Colors.RED}✗{Colors.NC} {group_name:20s} 找不到节点 {node_query}")
+                failed += 1
+            elif snap.groups[group_name].now == proxy_name:
+                print(f"  {Colors.BLUE}={Colors.NC} {group_name:20s} {proxy_name} (已是当前选择)")
+            else:
+                note = f" (匹配 {node_query})" if proxy_name != node_query else ""
+                plan.append((group_name, proxy_name, note))
+
+        if plan:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(plan)))) as pool:
+                futures = {pool.submit(self.put_selection, item[0], item[1]): item for item in plan}
+                for future in as_completed(futures):
+                    group_name, proxy_name, note = futures[future]
+                    try:
+                        future.result()
+                        print(f"  {Colors.GREEN}✓{Colors.NC} {group_name:20s} → {proxy_name}{note}")
+                    except requests.exceptions.RequestException as exc:
+                        print(f"  {Colors.RED}✗{Colors.NC} {group_name:20s} → {proxy_name}: {exc}")
+                        failed += 1
+
+        total = len(layout)
+        color = Colors.GREEN if not failed else Colors.YELLOW
+        print(f"\n{color}完成: {total - failed}/{total} 个策略组{Colors.NC}")
+        return failed == 0
+
     def get_current_selections(self) -> None:
         """Display the current selection for each proxy group."""
-        proxies = self.get_proxies()
+        snap = self.snapshot()
 
         print(f"\n{Colors.CYAN}{'='*70}{Colors.NC}")
         print(f"{Colors.CYAN}当前代理选择{Colors.NC}")
         print(f"{Colors.CYAN}{'='*70}{Colors.NC}\n")
 
-        groups = {name: info for name, info in proxies.items() if "all" in info and name != "GLOBAL"}
-
-        for group_name, group_info in groups.items():
-            current = group_info.get("now", "")
-            group_type = group_info.get("type", "")
+        for group_name, group in snap.groups.items():
+            current = group.now
             delay_str = ""
-            if current and current in proxies:
-                delay_str = format_delay(proxies[current].get("history", []))
+            if current in snap.nodes or current in snap.groups:
+                delay_str = human_delay(snap.delay_of(current))
 
             print(
                 f"📦 {Colors.BLUE}{group_name:30s}{Colors.NC} "
-                f"[{group_type:10s}] -> {Colors.GREEN}{current}{Colors.NC} {delay_str}"
+                f"[{group.type:10s}] -> {Colors.GREEN}{current}{Colors.NC} {delay_str}"
             )
 
 
-def format_delay(history: List[Dict]) -> str:
-    """Format the latest delay entry with color hints."""
-    delay = 0
-    if history:
-        delay = history[-1].get("delay", 0)
+class ProgressLine:
+    """Single carriage-return progress line for concurrent probes."""
+
+    def __init__(self, total: int, label: str = "测试"):
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.alive = 0
+        self._width = 0
+
+    def update(self, name: str, delay: Optional[int]) -> None:
+        self.done += 1
+        if delay:
+            self.alive += 1
+        text = f"[{self.done}/{self.total}] 可用 {self.alive} · {self.label} {name}"
+        padding = " " * max(0, self._width - len(text))
+        self._width = len(text)
+        print(f"{text}{padding}", end="\r", flush=True)
+
+    def finish(self) -> None:
+        if self._width:
+            print(" " * self._width, end="\r")
+
+
+def format_stats(stats: NodeStats) -> str:
+    """Render percentile/loss/EWMA columns for ``nodes --stats``."""
+
+    def cell(value: Optional[float]) -> str:
+        return f"{value:.0f}ms" if value is not None else "-"
 
-    return human_delay(delay)
+    loss = f"{stats.loss_rate * 100:.0f}%"
+    loss_color = Colors.GREEN if stats.loss_rate == 0 else Colors.YELLOW if stats.loss_rate < 0.2 else Colors.RED
+    return (
+        f"{cell(stats.p50):>7s} {cell(stats.p95):>7s} "
+        f"{loss_color}{loss:>6s}{Colors.NC} {cell(stats.ewma):>7s} {stats.count:5d}"
+    )
 
 
 def human_delay(delay: int) -> str:
@@ -0,0 +1,186 @@
+"""Trigram search over node and group names, cached in ``work_dir``."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .models import ProxyCatalog
+
+SEARCH_INDEX_FILENAME = "search-index.json"
+SEARCH_INDEX_VERSION = 1
+# Share of the query's trigrams a name must contain to count as a match.
+MIN_SCORE = 0.6
+KIND_NODE = "node"
+KIND_GROUP = "group"
+
+_FLAG_BASE = 0x1F1E6  # REGIONAL INDICATOR SYMBOL LETTER A
+
+
+def normalize(text: str) -> str:
+    """Casefold ``text`` into space-separated words.
+
+    Flag emoji become their ISO country code (🇭🇰 -> ``hk``), other symbols
+    become separators, and letter/digit runs are split (``HK01`` -> ``hk 01``).
+    """
+    out: List[str] = []
+    previous = " "
+    for char in unicodedata.normalize("NFKC", text).casefold():
+        code = ord(char)
+        if _FLAG_BASE <= code < _FLAG_BASE + 26:
+            if previous != "flag":
+                out.append(" ")
+            out.append(chr(ord("a") + code - _FLAG_BASE))
+            previous = "flag"
+            continue
+        if not char.isalnum():
+            out.append(" ")
+            previous = " "
+            continue
+        kind = "digit" if char.isdigit() else "alpha"
+        if previous not in (" ", kind):
+            out.append(" ")
+        out.append(char)
+        previous = kind
+    return " ".join("".join(out).split())
+
+
+def trigrams(text: str) -> Set[str]:
+    """Word-padded trigrams of normalised text (``hk`` -> ``"  h", " hk", "hk "``)."""
+    grams: Set[str] = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def names_signature(entries: Iterable[Tuple[str, str]]) -> str:
+    digest = hashlib.sha1()
+    for name, kind in entries:
+        digest.update(f"{kind}\0{name}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SearchMatch:
+    __slots__ = ("name", "kind", "score")
+
+    def __init__(self, name: str, kind: str, score: float):
+        self.name = name
+        self.kind = kind
+        self.score = score
+
+
+class SearchIndex:
+    """Inverted trigram index: trigram -> ids of the names containing it."""
+
+    def __init__(self, names: List[str], kinds: List[str], postings: Dict[str, List[int]], signature: str):
+        self.names = names
+        self.kinds = kinds
+        self.postings = postings
+        self.signature = signature
+        self._sizes: Optional[List[int]] = None
+
+    @classmethod
+    def build(cls, entries: List[Tuple[str, str]]) -> "SearchIndex":
+        postings: Dict[str, List[int]] = {}
+        for entry_id, (name, _kind) in enumerate(entries):
+            for gram in trigrams(name):
+                postings.setdefault(gram, []).append(entry_id)
+        return cls(
+            [name for name, _ in entries],
+            [kind for _, kind in entries],
+            postings,
+            names_signature(entries),
+        )
+
+    @classmethod
+    def for_catalog(cls, catalog: ProxyCatalog, path: Optional[Path] = None) -> "SearchIndex":
+        """Load the cached index at ``path`` if it covers ``catalog``, else rebuild it."""
+        entries = [(name, KIND_GROUP) for name in catalog.groups]
+        entries += [(name, KIND_NODE) for name in catalog.nodes]
+        signature = names_signature(entries)
+        if path is not None:
+            cached = cls.load(path)
+            if cached is not None and cached.signature == signature:
+                return cached
+        index = cls.build(entries)
+        if path is not None:
+            try:
+                index.save(path)
+            except OSError:
+                pass
+        return index
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["SearchIndex"]:
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != SEARCH_INDEX_VERSION:
+            return None
+        return cls(data["names"], data["kinds"], data["postings"], data["signature"])
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        payload = {
+            "version": SEARCH_INDEX_VERSION,
+            "signature": self.signature,
+            "names": self.names,
+            "kinds": self.kinds,
+            "postings": self.postings,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(".json.tmp")
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
+
+    def _name_sizes(self) -> List[int]:
+        if self._sizes is None:
+            sizes = [0] * len(self.names)
+            for ids in self.postings.values():
+                for entry_id in ids:
+                    sizes[entry_id] += 1
+            self._sizes = sizes
+        return self._sizes
+
+    def search(
+        self,
+        query: str,
+        kind: Optional[str] = None,
+        within: Optional[Set[str]] = None,
+        min_score: float = MIN_SCORE,
+    ) -> List[SearchMatch]:
+        """Names matching ``query``, best first.
+
+        ``score`` is the share of the query's trigrams found in the name;
+        ties prefer names with fewer extra trigrams (closer matches).
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        hits: Counter = Counter()
+        for gram in grams:
+            hits.update(self.postings.get(gram, ()))
+
+        sizes = self._name_sizes()
+        ranked: List[Tuple[float, int, int]] = []
+        for entry_id, count in hits.items():
+            score = count / len(grams)
+            if score < min_score:
+                continue
+            if kind is not None and self.kinds[entry_id] != kind:
+                continue
+            if within is not None and self.names[entry_id] not in within:
+                continue
+            ranked.append((score, sizes[entry_id] - count, entry_id))
+
+        ranked.sort(key=lambda item: (-item[0], item[1], item[2]))
+        return [SearchMatch(self.names[entry_id], self.kinds[entry_id], score) for score, _, entry_id in ranked]
@@ -0,0 +1,39 @@
+"""Indexed, time-stamped view of the controller's ``/proxies`` response."""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, Optional
+
+from .models import ProxyCatalog
+
+
+class ProxySnapshot(ProxyCatalog):
+    """One ``/proxies`` fetch, parsed once into a ``ProxyCatalog``.
+
+    ``groups`` holds strategy groups (everything with an ``all`` list,
+    except GLOBAL), ``nodes`` the leaf proxies without the built-ins, and
+    ``node_groups`` maps each member name to the groups containing it.
+    """
+
+    def __init__(self, proxies: Optional[Dict[str, Dict]] = None, fetched_at: Optional[float] = None):
+        super().__init__()
+        self.proxies = proxies if proxies is not None else {}
+        self.fetched_at = time.monotonic() if fetched_at is None else fetched_at
+
+    @classmethod
+    def from_controller(cls, proxies: Dict[str, Dict], fetched_at: Optional[float] = None) -> "ProxySnapshot":
+        snapshot = super().from_controller(proxies)
+        snapshot.proxies = proxies
+        if fetched_at is not None:
+            snapshot.fetched_at = fetched_at
+        return snapshot
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def set_selection(self, group_name: str, proxy_name: str) -> None:
+        """Reflect a successful switch without refetching."""
+        group = self.groups.get(group_name)
+        if group is not None:
+            group.now = proxy_name
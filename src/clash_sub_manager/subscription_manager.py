@@ -2,21 +2,74 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import re
 import shutil
+import sqlite3
 import subprocess
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 import requests
 import yaml
 
-from .config import DEFAULT_WORK_DIR, resolve_config_path
-from .console import Colors
+from .backup_store import BackupStore
+from .config import DEFAULT_WORK_DIR, resolve_config_path, resolve_work_dir
+from .console import Colors, ThreadOutputRouter
+from .history import PHASES, UpdateHistory, UpdateRun
+from .http_client import get_client
+from .merge import merge_files
+from .meta_store import SubscriptionMetadata
+from .models import ProxyCatalog
+from .party import PartyProfileIndex
+from .yaml_utils import SubscriptionSummary, scan_subscription
+
+STATUS_UPDATED = "updated"
+STATUS_NOT_MODIFIED = "not-modified"
+STATUS_UNCHANGED = "unchanged"
+STATUS_FAILED = "failed"
+STATUS_DISABLED = "disabled"
+STATUS_MISSING = "missing"
+STATUS_SKIPPED = "skipped"
+
+SUCCESS_STATUSES = (STATUS_UPDATED, STATUS_NOT_MODIFIED, STATUS_UNCHANGED)
+
+STATUS_LABELS = {
+    STATUS_UPDATED: f"{Colors.GREEN}已更新{Colors.NC}",
+    STATUS_NOT_MODIFIED: f"{Colors.CYAN}未修改 (304){Colors.NC}",
+    STATUS_UNCHANGED: f"{Colors.CYAN}内容未变化{Colors.NC}",
+    STATUS_FAILED: f"{Colors.RED}失败{Colors.NC}",
+    STATUS_DISABLED: f"{Colors.YELLOW}已禁用{Colors.NC}",
+    STATUS_MISSING: f"{Colors.RED}不存在{Colors.NC}",
+    STATUS_SKIPPED: f"{Colors.YELLOW}已跳过 (过期/流量耗尽){Colors.NC}",
+}
+
+DEFAULT_JOBS = 1
+DEFAULT_PER_HOST = 2
+DEFAULT_MAX_SIZE_MB = 20
+QUOTA_POLICY_OFF = "off"
+QUOTA_POLICY_LAST = "last"
+QUOTA_POLICY_SKIP = "skip"
+DEFAULT_QUOTA_RECHECK_HOURS = 24
+QUOTA_EXPIRED = "expired"
+QUOTA_EXHAUSTED = "exhausted"
+QUOTA_LABELS = {QUOTA_EXPIRED: "已过期", QUOTA_EXHAUSTED: "流量已用尽"}
+MIN_CONFIG_SIZE = 100
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+HTML_MARKERS = (b"<!doctype", b"<html", b"<head", b"<body")
+
+
+class DownloadRejected(Exception):
+    """Raised when a subscription body is aborted mid-download."""
 
 
 class ClashSubscriptionManager:
@@ -26,21 +79,28 @@ class ClashSubscriptionManager:
         self.config_path = Path(resolve_config_path(config_path)).expanduser()
         self.config = self.load_config()
 
-        config_dir = self.config_path.parent
+        self.work_dir = resolve_work_dir(self.config, self.config_path)
 
         if "clash_dir" in self.config:
-            clash_dir = Path(self.config["clash_dir"]).expanduser()
-            self.work_dir = clash_dir
             party_dir = self.config.get("clash_party_dir", self.config["clash_dir"])
         else:
-            default_work_dir = Path(self.config.get("work_dir", config_dir)).expanduser()
-            self.work_dir = default_work_dir
             party_dir = self.config.get("clash_party_dir")
             if not party_dir:
                 raise ValueError("配置缺少 clash_party_dir 字段，请先运行 clash-sub init-config 并填写配置路径")
 
         self.clash_party_dir = Path(party_dir).expanduser()
+        self.party_index = PartyProfileIndex(self.clash_party_dir)
         self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.metadata = SubscriptionMetadata(self.work_dir)
+        self.backups = BackupStore(self.work_dir / "backups")
+        self.history = UpdateHistory(self.work_dir)
+        self.http = get_client(self.config.get("http"))
+
+        self._party_lock = threading.Lock()
+        self._host_lock = threading.Lock()
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._per_host = DEFAULT_PER_HOST
+        self._party_batch: Optional[Dict[str, int]] = None
 
     def load_config(self) -> Dict:
         """Load config JSON and ensure critical sections exist."""
@@ -55,6 +115,8 @@ class ClashSubscriptionManager:
         data.setdefault("subscriptions", {})
         data.setdefault("backup", {"enabled": True, "max_backups": 5})
         data.setdefault("api", {})
+        data.setdefault("update", {"jobs": DEFAULT_JOBS, "per_host": DEFAULT_PER_HOST})
+        data.setdefault("download", {"max_size_mb": DEFAULT_MAX_SIZE_MB})
         return data
 
     def get_api_credentials(self) -> tuple[str, str]:
@@ -82,8 +144,13 @@ class ClashSubscriptionManager:
             json.dump(self.config, handle, indent=2, ensure_ascii=False)
         print(f"{Colors.GREEN}✓ 配置已保存{Colors.NC}")
 
-    def list_subscriptions(self) -> None:
-        """List configured subscriptions and cache metadata."""
+    def list_subscriptions(self, rescan: bool = False) -> None:
+        """List configured subscriptions from the metadata index.
+
+        Size, node count, protocol mix and the last run all come from
+        ``metadata.json``, so listing never stats or parses the YAML files.
+        ``rescan`` rebuilds those fields from the files first.
+        """
         print(f"\n{Colors.CYAN}{'='*60}{Colors.NC}")
         print(f"{Colors.CYAN}订阅列表{Colors.NC}")
         print(f"{Colors.CYAN}{'='*60}{Colors.NC}\n")
@@ -93,6 +160,9 @@ class ClashSubscriptionManager:
             print(f"{Colors.YELLOW}没有配置任何订阅{Colors.NC}")
             return
 
+        if rescan:
+            self.rescan_index(subscriptions)
+
         for name, sub in subscriptions.items():
             status = (
                 f"{Colors.GREEN}启用{Colors.NC}"
@@ -101,23 +171,78 @@ class ClashSubscriptionManager:
             )
             url = sub.get("url", "")
             short_url = f"{url[:50]}..." if len(url) > 50 else url
+            record = self.metadata.get(name)
             print(f"📦 {Colors.BLUE}{name}{Colors.NC}")
             print(f"   状态: {status}")
             print(f"   描述: {sub.get('description', '无')}")
             print(f"   URL: {short_url}")
+            print(f"   Clash Party: {self._describe_party_link(url)}")
+            for line in format_userinfo(record.get("userinfo")):
+                print(f"   {line}")
 
-            config_file = self.work_dir / f"{name}.yaml"
-            if config_file.exists():
-                size = config_file.stat().st_size / 1024
-                mtime = datetime.fromtimestamp(config_file.stat().st_mtime)
-                print(f"   文件: {Colors.GREEN}存在{Colors.NC} ({size:.1f} KB)")
+            if record.get("size") is not None:
+                mtime = datetime.fromtimestamp(record.get("mtime_ns", 0) / 1e9)
+                print(f"   文件: {Colors.GREEN}存在{Colors.NC} ({record['size'] / 1024:.1f} KB)")
                 print(f"   更新: {mtime.strftime('%Y-%m-%d %H:%M:%S')}")
+                if record.get("nodes") is not None:
+                    groups = f"，策略组 {record['groups']} 个" if record.get("groups") else ""
+                    print(f"   节点: {record['nodes']} 个 {format_type_counts(record.get('types') or {})}{groups}")
+                else:
+                    print(f"   节点: {Colors.YELLOW}未记录{Colors.NC} (运行 clash-sub list --rescan 生成)")
             else:
-                print(f"   文件: {Colors.YELLOW}不存在{Colors.NC}")
+                print(f"   文件: {Colors.YELLOW}未下载{Colors.NC}")
+
+            if record.get("last_status"):
+                ran = datetime.fromtimestamp(record.get("last_run", 0)).strftime("%Y-%m-%d %H:%M:%S")
+                label = STATUS_LABELS.get(record["last_status"], record["last_status"])
+                print(f"   上次运行: {label} ({record.get('last_duration', 0):.1f}s, {ran})")
             print()
 
-    def backup_config(self, config_name: str) -> Optional[Path]:
-        """Backup the cached YAML before overwriting."""
+    def rescan_index(self, subscriptions: Dict) -> None:
+        """Refresh size/hash/node fields of the index from the YAML files."""
+        for name in subscriptions:
+            config_file = self.work_dir / f"{name}.yaml"
+            try:
+                stat = config_file.stat()
+            except FileNotFoundError:
+                continue
+            record = self.metadata.get(name)
+            if (
+                record.get("nodes") is not None
+                and record.get("size") == stat.st_size
+                and record.get("mtime_ns") == stat.st_mtime_ns
+            ):
+                continue
+            self.metadata.update(
+                name,
+                sha256=file_sha256(config_file),
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                **self._scan_content(config_file),
+            )
+
+    def _scan_content(self, config_file: Path) -> Dict:
+        try:
+            with open(config_file, "rb") as handle:
+                summary, groups = summarize_subscription(handle)
+        except yaml.YAMLError:
+            return {"nodes": None, "types": {}, "groups": 0}
+        return content_fields(summary, groups)
+
+    def _describe_party_link(self, url: str) -> str:
+        try:
+            if not self.party_index.exists():
+                return f"{Colors.YELLOW}未找到 profile.yaml{Colors.NC}"
+            item = self.party_index.by_url(url)
+        except yaml.YAMLError:
+            return f"{Colors.YELLOW}profile.yaml 解析失败{Colors.NC}"
+        if item is None:
+            return f"{Colors.YELLOW}未关联{Colors.NC}"
+        active = " (当前激活)" if self.party_index.current == item.get("id") else ""
+        return f"{Colors.GREEN}{item.get('id')}{Colors.NC}{active}"
+
+    def backup_config(self, config_name: str) -> Optional[Dict]:
+        """Snapshot the cached YAML into the backup store before overwriting."""
         backup_cfg = self.config.get("backup", {})
         if not backup_cfg.get("enabled", True):
             return None
@@ -126,54 +251,202 @@ class ClashSubscriptionManager:
         if not config_file.exists():
             return None
 
-        backup_dir = self.work_dir / "backups"
-        backup_dir.mkdir(exist_ok=True)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = backup_dir / f"{config_name}.{timestamp}.yaml"
-        shutil.copy2(config_file, backup_file)
-        print(f"{Colors.GREEN}✓ 备份已保存: {backup_file.name}{Colors.NC}")
+        self.backups.import_legacy(config_name)
+        snapshot = self.backups.add(
+            config_name, config_file, digest=self._current_digest(config_name, config_file)
+        )
+        if snapshot is None:
+            print(f"{Colors.GREEN}✓ 备份已存在，无需重复保存{Colors.NC}")
+            return None
 
+        print(f"{Colors.GREEN}✓ 备份已保存: {config_name}@{snapshot['id']}{Colors.NC}")
         self.cleanup_old_backups(config_name)
-        return backup_file
+        return snapshot
 
     def cleanup_old_backups(self, config_name: str) -> None:
-        """Trim old backup files based on config retention count."""
+        """Trim old snapshots based on config retention count."""
         max_backups = self.config.get("backup", {}).get("max_backups", 5)
-        backup_dir = self.work_dir / "backups"
+        for snapshot in self.backups.trim(config_name, max_backups):
+            print(f"{Colors.YELLOW}⚠ 已删除旧备份: {config_name}@{snapshot['id']}{Colors.NC}")
+
+    def show_history(self, name: Optional[str] = None, limit: int = 20) -> None:
+        """Print the most recent update runs recorded in history.db."""
+        print(f"\n{Colors.CYAN}{'='*60}{Colors.NC}")
+        print(f"{Colors.CYAN}更新历史{f': {name}' if name else ''}{Colors.NC}")
+        print(f"{Colors.CYAN}{'='*60}{Colors.NC}\n")
+
+        runs = self.history.runs(name, limit)
+        if not runs:
+            print(f"{Colors.YELLOW}没有任何更新记录{Colors.NC}")
+            return
+
+        width = max(len(run["name"]) for run in runs)
+        for run in runs:
+            started = datetime.fromtimestamp(run["started"]).strftime("%Y-%m-%d %H:%M:%S")
+            label = STATUS_LABELS.get(run["status"], run["status"])
+            phases = " ".join(
+                f"{phase} {run[f'{phase}_ms']}ms" for phase in PHASES if run[f"{phase}_ms"] is not None
+            )
+            details = [f"{run['total_ms'] / 1000:.1f}s"]
+            if run["http_status"] is not None:
+                details.append(f"HTTP {run['http_status']}")
+            if run["bytes"] is not None:
+                details.append(human_bytes(run["bytes"]))
+            if run["nodes"] is not None:
+                details.append(f"{run['nodes']} 节点")
+            if run["sha256"]:
+                details.append(run["sha256"][:12])
+            print(f"  {started}  {Colors.BLUE}{run['name']:{width}s}{Colors.NC}  {label}  {' · '.join(details)}")
+            if phases:
+                print(f"  {'':19s}  {'':{width}s}  {phases}")
+            if run["error"]:
+                print(f"  {'':19s}  {'':{width}s}  {Colors.RED}{run['error']}{Colors.NC}")
+
+    def show_stats(self, days: Optional[float] = None) -> None:
+        """Print per-subscription success rate, timings and volume."""
+        print(f"\n{Colors.CYAN}{'='*60}{Colors.NC}")
+        print(f"{Colors.CYAN}更新统计{f' (最近 {days:g} 天)' if days else ''}{Colors.NC}")
+        print(f"{Colors.CYAN}{'='*60}{Colors.NC}\n")
 
-        if not backup_dir.exists() or max_backups <= 0:
+        rows = self.history.stats(time.time() - days * 86400 if days else None)
+        if not rows:
+            print(f"{Colors.YELLOW}没有任何更新记录{Colors.NC}")
             return
 
-        backups = sorted(
-            backup_dir.glob(f"{config_name}.*.yaml"),
-            key=lambda file: file.stat().st_mtime,
-            reverse=True,
+        width = max(4, max(len(row["name"]) for row in rows))
+        print(f"  {'订阅':{width - 2}s}  {'次数':>4s} {'成功率':>5s} {'变更':>4s} {'平均耗时':>6s} {'最长':>6s} {'流量':>10s}  最近变更 / 最近失败")
+        for row in rows:
+            rate = row["ok"] / row["runs"] * 100
+            color = Colors.GREEN if rate >= 90 else Colors.YELLOW if rate >= 50 else Colors.RED
+            changed = _format_stamp(row["last_changed"])
+            failed = _format_stamp(row["last_failed"])
+            print(
+                f"  {Colors.BLUE}{row['name']:{width}s}{Colors.NC}  {row['runs']:>6d} "
+                f"{color}{rate:>7.0f}%{Colors.NC} {row['changed']:>6d} "
+                f"{row['avg_ms'] / 1000:>9.1f}s {row['max_ms'] / 1000:>7.1f}s {human_bytes(row['bytes']):>12s}  "
+                f"{changed} / {failed}"
+            )
+
+    def list_backups(self, name: Optional[str] = None) -> None:
+        """Print stored snapshots for one or all subscriptions."""
+        print(f"\n{Colors.CYAN}{'='*60}{Colors.NC}")
+        print(f"{Colors.CYAN}备份列表{Colors.NC}")
+        print(f"{Colors.CYAN}{'='*60}{Colors.NC}\n")
+
+        names = [name] if name else self.backups.names()
+        if not any(self.backups.snapshots(item) for item in names):
+            print(f"{Colors.YELLOW}没有任何备份{Colors.NC}")
+            return
+
+        for item in names:
+            snapshots = self.backups.snapshots(item)
+            if not snapshots:
+                continue
+            print(f"📦 {Colors.BLUE}{item}{Colors.NC}")
+            for snapshot in reversed(snapshots):
+                created = datetime.fromtimestamp(snapshot["created"]).strftime("%Y-%m-%d %H:%M:%S")
+                print(
+                    f"   {snapshot['id']:20s} {created}  "
+                    f"{snapshot['size']/1024:8.1f} KB  {snapshot['sha256'][:12]}"
+                )
+            print()
+
+    def restore_backup(self, name: str, snapshot_id: Optional[str] = None) -> bool:
+        """Restore a snapshot (latest by default) and sync it to Clash Party."""
+        subscriptions = self.config.get("subscriptions", {})
+        snapshot = self.backups.find(name, snapshot_id)
+        if snapshot is None:
+            target = f"{name}@{snapshot_id}" if snapshot_id else name
+            print(f"{Colors.RED}✗ 未找到备份: {target}{Colors.NC}")
+            return False
+
+        config_file = self.work_dir / f"{name}.yaml"
+        if config_file.exists() and self._current_digest(name, config_file) == snapshot["sha256"]:
+            print(f"{Colors.YELLOW}⚠ 当前配置与备份 {snapshot['id']} 相同，无需恢复{Colors.NC}")
+            return True
+
+        try:
+            data = self.backups.read(snapshot)
+        except FileNotFoundError:
+            print(f"{Colors.RED}✗ 备份 {name}@{snapshot['id']} 的数据文件已丢失，无法恢复{Colors.NC}")
+            print(f"{Colors.YELLOW}  提示: 可运行 clash-sub backups list {name} 选择其他备份{Colors.NC}")
+            return False
+        self.backup_config(name)
+        temp_file = config_file.with_suffix(".yaml.tmp")
+        temp_file.write_bytes(data)
+        os.replace(temp_file, config_file)
+
+        stat = config_file.stat()
+        # Drop HTTP validators so the next update re-downloads instead of
+        # trusting a 304 for content we just replaced.
+        self.metadata.update(
+            name,
+            sha256=snapshot["sha256"],
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            etag=None,
+            last_modified=None,
+            **self._scan_content(config_file),
         )
+        print(f"{Colors.GREEN}✓ 已恢复备份: {name}@{snapshot['id']}{Colors.NC}")
 
-        for backup in backups[max_backups:]:
-            backup.unlink(missing_ok=True)
-            print(f"{Colors.YELLOW}⚠ 已删除旧备份: {backup.name}{Colors.NC}")
+        sub = subscriptions.get(name)
+        if sub and sub.get("url"):
+            self.update_clash_party_profile(config_file, sub["url"])
+        return True
+
+    @contextmanager
+    def _host_slot(self, url: str) -> Iterator[None]:
+        """Limit how many downloads may hit the same host at once."""
+        host = (urlsplit(url).hostname or "").lower()
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(max(1, self._per_host))
+                self._host_slots[host] = slot
+        with slot:
+            yield
+
+    def _set_per_host(self, per_host: int) -> None:
+        """Change the per-host download limit, dropping semaphores sized for the old one."""
+        per_host = max(1, int(per_host))
+        with self._host_lock:
+            if per_host != self._per_host:
+                self._per_host = per_host
+                self._host_slots = {}
 
     def update_subscription(self, name: str) -> bool:
         """Download and validate a single subscription."""
+        try:
+            return self._timed_update(name)[1] in SUCCESS_STATUSES
+        finally:
+            self._flush_history()
+
+    def _update_subscription(self, name: str, run: UpdateRun) -> str:
+        """Run the update pipeline for one subscription and return its status.
+
+        Timings, HTTP status, size, hash, node count and the error (if any)
+        are filled into ``run`` along the way.
+        """
         subscriptions = self.config.get("subscriptions", {})
         if name not in subscriptions:
             print(f"{Colors.RED}✗ 订阅不存在: {name}{Colors.NC}")
-            return False
+            return STATUS_MISSING
 
         sub = subscriptions[name]
 
         if not sub.get("enabled", True):
             print(f"{Colors.YELLOW}⚠ 订阅已禁用: {name}{Colors.NC}")
-            return False
+            return STATUS_DISABLED
+
+        state = quota_state(self.metadata.get(name).get("userinfo"))
+        if state is not None:
+            print(f"{Colors.YELLOW}⚠ 上次更新时订阅{QUOTA_LABELS[state]}: {name}{Colors.NC}")
 
         print(f"\n{Colors.CYAN}{'='*60}{Colors.NC}")
         print(f"{Colors.CYAN}更新订阅: {name}{Colors.NC}")
         print(f"{Colors.CYAN}{'='*60}{Colors.NC}\n")
 
-        self.backup_config(name)
-
         config_file = self.work_dir / f"{name}.yaml"
         temp_file = config_file.with_suffix(".yaml.tmp")
 
@@ -181,64 +454,167 @@ class ClashSubscriptionManager:
 
         try:
             headers = {"User-Agent": "clash-verge/v1.3.8"}
-            response = requests.get(sub["url"], headers=headers, timeout=30)
-            response.raise_for_status()
-
-            if not response.content:
+            cached = self.metadata.get(name)
+            # Expired/exhausted records are refetched in full: many providers
+            # omit subscription-userinfo on 304, so a renewal would go unseen.
+            if (
+                state is None
+                and cached.get("url") == sub["url"]
+                and cached.get("sha256") == self._current_digest(name, config_file)
+            ):
+                headers.update(conditional_headers(cached))
+
+            with run.phase("download"), self._host_slot(sub["url"]):
+                with self.http.get(sub["url"], "subscription", headers=headers, stream=True) as response:
+                    run.http_status = response.status_code
+                    if response.status_code == 304:
+                        self.metadata.update(name, checked=int(time.time()), **provider_hints(response.headers))
+                        print(f"{Colors.GREEN}✓ 订阅未修改 (HTTP 304)，跳过更新{Colors.NC}")
+                        return STATUS_NOT_MODIFIED
+
+                    response.raise_for_status()
+                    size, digest = self._stream_to_file(response, temp_file, self._max_download_size(sub))
+            run.bytes, run.sha256 = size, digest
+
+            if size == 0:
+                run.error = "下载的配置文件为空"
                 print(f"{Colors.RED}✗ 下载的配置文件为空{Colors.NC}")
-                return False
+                temp_file.unlink(missing_ok=True)
+                return STATUS_FAILED
 
-            with open(temp_file, "wb") as handle:
-                handle.write(response.content)
+            validators = {
+                "url": sub["url"],
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                **provider_hints(response.headers),
+            }
+            if digest == self._current_digest(name, config_file):
+                temp_file.unlink(missing_ok=True)
+                self.metadata.update(name, checked=int(time.time()), **validators)
+                print(f"{Colors.GREEN}✓ 订阅内容未变化，跳过备份、同步与重载{Colors.NC}")
+                return STATUS_UNCHANGED
 
-            size = temp_file.stat().st_size
-            if size < 100:
+            if size < MIN_CONFIG_SIZE:
+                run.error = f"配置文件过小 ({size} bytes)"
                 print(f"{Colors.RED}✗ 下载的配置文件异常 (大小: {size} bytes){Colors.NC}")
                 temp_file.unlink(missing_ok=True)
-                return False
+                return STATUS_FAILED
 
+            summary: Optional[SubscriptionSummary] = None
+            group_count = 0
             try:
-                with open(temp_file, "r", encoding="utf-8") as handle:
-                    config_data = yaml.safe_load(handle) or {}
-
-                if not isinstance(config_data, dict):
-                    raise ValueError("不是有效的 YAML 对象")
-
-                if "proxies" not in config_data and "proxy-providers" not in config_data:
-                    raise ValueError("缺少 proxies 或 proxy-providers 字段")
+                with run.phase("validate"), open(temp_file, "rb") as handle:
+                    summary, group_count = summarize_subscription(handle)
+                    summary.validate()
+                run.nodes = summary.proxy_count
             except (yaml.YAMLError, ValueError) as exc:
+                run.error = f"配置文件格式错误: {exc}"
                 print(f"{Colors.RED}✗ 配置文件格式错误: {exc}{Colors.NC}")
                 print(f"{Colors.YELLOW}  提示：订阅链接可能不是 Clash 格式{Colors.NC}")
                 temp_file.unlink(missing_ok=True)
-                return False
+                return STATUS_FAILED
             except Exception as exc:
                 print(f"{Colors.YELLOW}⚠ 警告：无法验证配置文件格式，继续更新: {exc}{Colors.NC}")
 
+            with run.phase("backup"):
+                self.backup_config(name)
             shutil.move(str(temp_file), str(config_file))
             print(f"{Colors.GREEN}✓ 配置已更新 (大小: {size/1024:.1f} KB){Colors.NC}")
 
-            try:
-                with open(config_file, "r", encoding="utf-8") as handle:
-                    config_content = yaml.safe_load(handle) or {}
-                proxy_count = len(config_content.get("proxies", []))
-                print(f"{Colors.GREEN}✓ 代理节点数量: {proxy_count}{Colors.NC}")
-            except Exception:
-                pass
+            now = int(time.time())
+            stat = config_file.stat()
+            content = content_fields(summary, group_count) if summary is not None else {}
+            self.metadata.update(
+                name,
+                sha256=digest,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                checked=now,
+                updated=now,
+                **validators,
+                **content,
+            )
 
-            self.update_clash_party_profile(config_file, sub["url"])
-            return True
+            if summary is not None:
+                groups = f"，策略组 {group_count} 个" if group_count else ""
+                print(f"{Colors.GREEN}✓ 代理节点数量: {summary.proxy_count}{groups}{Colors.NC}")
 
+            with run.phase("sync"):
+                self.update_clash_party_profile(config_file, sub["url"])
+            return STATUS_UPDATED
+
+        except DownloadRejected as exc:
+            run.error = str(exc)
+            print(f"{Colors.RED}✗ 已中止下载: {exc}{Colors.NC}")
+            print(f"{Colors.YELLOW}  提示：订阅链接可能不是 Clash 格式{Colors.NC}")
+            temp_file.unlink(missing_ok=True)
+            return STATUS_FAILED
         except requests.exceptions.RequestException as exc:
+            run.error = str(exc)
             print(f"{Colors.RED}✗ 下载失败: {exc}{Colors.NC}")
             temp_file.unlink(missing_ok=True)
-            return False
+            return STATUS_FAILED
         except Exception as exc:
+            run.error = str(exc)
             print(f"{Colors.RED}✗ 更新失败: {exc}{Colors.NC}")
             temp_file.unlink(missing_ok=True)
-            return False
+            return STATUS_FAILED
+
+    def _max_download_size(self, sub: Dict) -> int:
+        """Return the byte cap for a subscription (per-sub override first)."""
+        download_cfg = self.config.get("download", {}) or {}
+        limit_mb = sub.get("max_size_mb", download_cfg.get("max_size_mb", DEFAULT_MAX_SIZE_MB))
+        return int(float(limit_mb) * 1024 * 1024)
+
+    def _stream_to_file(
+        self, response: requests.Response, temp_file: Path, max_bytes: int
+    ) -> Tuple[int, str]:
+        """Write the body to ``temp_file`` chunk by chunk, hashing as it goes."""
+        content_type = response.headers.get("Content-Type", "").lower()
+        if "text/html" in content_type:
+            raise DownloadRejected(f"服务器返回了 HTML 页面 ({content_type})")
+
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and max_bytes > 0 and int(declared) > max_bytes:
+            raise DownloadRejected(f"配置文件过大 ({int(declared)/1024/1024:.1f} MB > {max_bytes/1024/1024:.1f} MB)")
+
+        digest = hashlib.sha256()
+        size = 0
+        with open(temp_file, "wb") as handle:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if not chunk:
+                    continue
+                if size == 0 and chunk.lstrip()[:16].lower().startswith(HTML_MARKERS):
+                    raise DownloadRejected("服务器返回了 HTML 页面")
+                size += len(chunk)
+                if max_bytes > 0 and size > max_bytes:
+                    raise DownloadRejected(f"配置文件超过大小上限 ({max_bytes/1024/1024:.1f} MB)")
+                digest.update(chunk)
+                handle.write(chunk)
+
+        return size, digest.hexdigest()
+
+    def _current_digest(self, name: str, config_file: Path) -> Optional[str]:
+        """Return the SHA-256 of the cached YAML, trusting metadata when fresh."""
+        try:
+            stat = config_file.stat()
+        except FileNotFoundError:
+            return None
+
+        record = self.metadata.get(name)
+        if (
+            record.get("sha256")
+            and record.get("size") == stat.st_size
+            and record.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            return record["sha256"]
+        return file_sha256(config_file)
+
+    def update_all(self, jobs: Optional[int] = None, per_host: Optional[int] = None) -> None:
+        """Update all enabled subscriptions, optionally in parallel."""
+        update_cfg = self.config.get("update", {}) or {}
+        jobs = max(1, jobs or update_cfg.get("jobs", DEFAULT_JOBS))
 
-    def update_all(self) -> None:
-        """Update all enabled subscriptions."""
         print(f"\n{Colors.MAGENTA}{'='*60}{Colors.NC}")
         print(f"{Colors.MAGENTA}更新所有订阅{Colors.NC}")
         print(f"{Colors.MAGENTA}{'='*60}{Colors.NC}")
@@ -253,33 +629,120 @@ class ClashSubscriptionManager:
             print(f"\n{Colors.YELLOW}没有启用的订阅{Colors.NC}")
             return
 
-        success = 0
-        for name in enabled:
-            if self.update_subscription(name):
-                success += 1
+        self.update_many(enabled, jobs, per_host)
+
+    def update_many(
+        self, names: List[str], jobs: int, per_host: Optional[int] = None
+    ) -> List[Tuple[str, str, float]]:
+        """Update ``names`` with one profile.yaml write and print the summary.
+
+        ``per_host`` defaults to ``update.per_host`` from the current config.
+        """
+        update_cfg = self.config.get("update", {}) or {}
+        self._set_per_host(per_host or update_cfg.get("per_host", DEFAULT_PER_HOST))
+        names, skipped = self._apply_quota_policy(names)
+        results: List[Tuple[str, str, float]] = []
+        if names:
+            try:
+                with self.party_batch():
+                    results = self._run_updates(names, jobs)
+            finally:
+                self._flush_history()
+        results.extend((name, STATUS_SKIPPED, 0.0) for name in skipped)
+
+        self._print_update_summary(results)
+        return results
+
+    def _apply_quota_policy(self, names: List[str]) -> Tuple[List[str], List[str]]:
+        """Reorder or drop expired/exhausted subscriptions per ``update.quota_policy``.
+
+        ``last`` moves them to the end; ``skip`` leaves them out, except
+        once every ``quota_recheck_hours`` so a renewal is noticed.
+        Returns ``(to_update, skipped)``.
+        """
+        update_cfg = self.config.get("update", {}) or {}
+        policy = update_cfg.get("quota_policy", QUOTA_POLICY_OFF)
+        if policy not in (QUOTA_POLICY_LAST, QUOTA_POLICY_SKIP):
+            return names, []
+        recheck = float(update_cfg.get("quota_recheck_hours", DEFAULT_QUOTA_RECHECK_HOURS)) * 3600
+
+        now = time.time()
+        active: List[str] = []
+        deferred: List[str] = []
+        skipped: List[str] = []
+        for name in names:
+            record = self.metadata.get(name)
+            state = quota_state(record.get("userinfo"), now)
+            if state is None:
+                active.append(name)
+            elif policy == QUOTA_POLICY_SKIP and now - record.get("checked", 0) < recheck:
+                print(f"{Colors.YELLOW}⚠ {name}: 订阅{QUOTA_LABELS[state]}，跳过更新{Colors.NC}")
+                skipped.append(name)
+            else:
+                deferred.append(name)
+        return active + deferred, skipped
+
+    def _run_updates(self, enabled: List[str], jobs: int) -> List[Tuple[str, str, float]]:
+        if jobs == 1:
+            return [self._timed_update(name) for name in enabled]
+
+        print(f"{Colors.BLUE}并发数: {jobs}，单主机并发上限: {self._per_host}{Colors.NC}")
+        stdout = sys.stdout
+        router = ThreadOutputRouter(stdout)
+
+        def run(name: str) -> Tuple[str, str, float]:
+            with router.capture():
+                return self._timed_update(name)
+
+        sys.stdout = router
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                return list(pool.map(run, enabled))
+        finally:
+            sys.stdout = stdout
+
+    def _timed_update(self, name: str) -> Tuple[str, str, float]:
+        run = UpdateRun(name)
+        started = time.monotonic()
+        status = self._update_subscription(name, run)
+        elapsed = time.monotonic() - started
+        if status != STATUS_MISSING:
+            self.metadata.update(name, last_status=status, last_duration=round(elapsed, 2), last_run=int(time.time()))
+        if status not in (STATUS_MISSING, STATUS_DISABLED):
+            run.status = status
+            run.total_ms = int(elapsed * 1000)
+            self.history.record(run)
+        return name, status, elapsed
+
+    def _flush_history(self) -> None:
+        try:
+            self.history.flush()
+        except sqlite3.Error as exc:
+            print(f"{Colors.YELLOW}⚠ 写入更新历史失败: {exc}{Colors.NC}")
+
+    def _print_update_summary(self, results: List[Tuple[str, str, float]]) -> None:
+        success = sum(1 for _, status, _ in results if status in SUCCESS_STATUSES)
+        width = max(len(name) for name, _, _ in results)
 
         print(f"\n{Colors.CYAN}{'='*60}{Colors.NC}")
-        print(f"{Colors.GREEN}✓ 更新完成: {success}/{len(enabled)}{Colors.NC}")
+        for name, status, elapsed in results:
+            label = STATUS_LABELS.get(status, status)
+            print(f"  {Colors.BLUE}{name:{width}s}{Colors.NC}  {label}  ({elapsed:.1f}s)")
+        print(f"\n{Colors.GREEN}✓ 更新完成: {success}/{len(results)}{Colors.NC}")
         print(f"{Colors.CYAN}{'='*60}{Colors.NC}\n")
 
     def update_clash_party_profile(self, config_file: Path, sub_url: str) -> bool:
         """Sync downloaded config into Clash Party profile directory."""
-        try:
-            profile_yaml = self.clash_party_dir / "profile.yaml"
+        with self._party_lock:
+            return self._update_clash_party_profile(config_file, sub_url)
 
-            if not profile_yaml.exists():
+    def _update_clash_party_profile(self, config_file: Path, sub_url: str) -> bool:
+        try:
+            if not self.party_index.exists():
                 print(f"{Colors.YELLOW}⚠ 未找到 Clash Party 配置{Colors.NC}")
                 return False
 
-            with open(profile_yaml, "r", encoding="utf-8") as handle:
-                profile_data = yaml.safe_load(handle) or {}
-
-            matched_profile = None
-            for item in profile_data.get("items", []):
-                if item.get("url") == sub_url:
-                    matched_profile = item
-                    break
-
+            matched_profile = self.party_index.by_url(sub_url)
             if not matched_profile:
                 print(f"{Colors.YELLOW}⚠ 未在 Clash Party 中找到此订阅{Colors.NC}")
                 print(f"{Colors.YELLOW}  提示: 请先在 Clash Party 中添加 URL 为 {sub_url} 的订阅{Colors.NC}")
@@ -290,14 +753,13 @@ class ClashSubscriptionManager:
             party_profile.parent.mkdir(parents=True, exist_ok=True)
             shutil.copy2(config_file, party_profile)
 
-            for item in profile_data.get("items", []):
-                if item.get("id") == profile_uid:
-                    item["updated"] = int(time.time() * 1000)
-                    break
-
-            with open(profile_yaml, "w", encoding="utf-8") as handle:
-                yaml.dump(profile_data, handle, allow_unicode=True, default_flow_style=False)
+            updated_at = int(time.time() * 1000)
+            if self._party_batch is not None:
+                self._party_batch[profile_uid] = updated_at
+                print(f"{Colors.GREEN}✓ 已同步 Clash Party 配置文件，profile.yaml 将在全部完成后统一写入{Colors.NC}")
+                return True
 
+            profile_data = self.party_index.mark_updated({profile_uid: updated_at})
             print(f"{Colors.GREEN}✓ 已更新 Clash Party 配置文件{Colors.NC}")
 
             if profile_data.get("current") == profile_uid:
@@ -310,20 +772,53 @@ class ClashSubscriptionManager:
             print(f"{Colors.YELLOW}⚠ 更新 Clash Party 配置失败: {exc}{Colors.NC}")
             return False
 
+    @contextmanager
+    def party_batch(self) -> Iterator[None]:
+        """Defer profile.yaml writes and core reloads until the block exits.
+
+        Profile files are still copied as each subscription finishes; the
+        ``updated`` stamps are written to profile.yaml once, and Clash is
+        reloaded at most once, only if the active profile was touched.
+        """
+        with self._party_lock:
+            self._party_batch = {}
+        try:
+            yield
+        finally:
+            with self._party_lock:
+                pending, self._party_batch = self._party_batch, None
+                if pending:
+                    self._flush_party_batch(pending)
+
+    def _flush_party_batch(self, pending: Dict[str, int]) -> bool:
+        try:
+            profile_data = self.party_index.mark_updated(pending)
+            print(f"{Colors.GREEN}✓ 已批量更新 Clash Party 配置文件 ({len(pending)} 个订阅){Colors.NC}")
+
+            if profile_data.get("current") in pending:
+                return self.reload_clash_core()
+
+            print(f"{Colors.YELLOW}  提示: 当前激活的配置未变化，无需重新加载{Colors.NC}")
+            return True
+
+        except Exception as exc:
+            print(f"{Colors.YELLOW}⚠ 更新 Clash Party 配置失败: {exc}{Colors.NC}")
+            return False
+
     def reload_clash_core(self) -> bool:
         """Trigger Clash to reload configuration via API."""
         try:
             api_url, secret = self.get_api_credentials()
             headers = {"Authorization": f"Bearer {secret}"} if secret else {}
 
-            response = requests.post(f"{api_url}/configs/reload", headers=headers, timeout=5)
+            response = self.http.post(f"{api_url}/configs/reload", "reload", headers=headers)
 
             if response.status_code == 404:
-                response = requests.patch(
+                response = self.http.patch(
                     f"{api_url}/configs",
+                    "reload",
                     headers={**headers, "Content-Type": "application/json"},
                     json={"mode": "rule"},
-                    timeout=5,
                 )
 
             if response.status_code < 400:
@@ -344,20 +839,61 @@ class ClashSubscriptionManager:
             api_url, secret = self.get_api_credentials()
             headers = {"Authorization": f"Bearer {secret}"} if secret else {}
 
-            response = requests.get(f"{api_url}/proxies", headers=headers, timeout=3)
+            response = self.http.get(f"{api_url}/proxies", "check", headers=headers)
             response.raise_for_status()
 
-            proxies = response.json().get("proxies", {})
-            nodes = {
-                name: info
-                for name, info in proxies.items()
-                if "all" not in info and name not in ["DIRECT", "REJECT", "GLOBAL"]
-            }
-            return len(nodes) > 0
+            catalog = ProxyCatalog.from_controller(response.json().get("proxies", {}))
+            return bool(catalog.nodes)
 
         except Exception:
             return True
 
+    def merge_subscriptions(self, output: str | Path, names: Optional[List[str]] = None) -> bool:
+        """Merge downloaded subscriptions into one deduplicated profile at ``output``.
+
+        Defaults to every enabled subscription; the first source provides
+        the base settings and rules.
+        """
+        print(f"\n{Colors.CYAN}{'='*60}{Colors.NC}")
+        print(f"{Colors.CYAN}合并订阅{Colors.NC}")
+        print(f"{Colors.CYAN}{'='*60}{Colors.NC}\n")
+
+        subscriptions = self.config.get("subscriptions", {})
+        if not names:
+            names = [name for name, sub in subscriptions.items() if sub.get("enabled", True)]
+        sources: List[Tuple[str, Path]] = []
+        for name in dict.fromkeys(names):
+            config_file = self.work_dir / f"{name}.yaml"
+            if name not in subscriptions:
+                print(f"{Colors.YELLOW}⚠ 订阅不存在，已忽略: {name}{Colors.NC}")
+            elif not config_file.exists():
+                print(f"{Colors.YELLOW}⚠ 尚未下载，已忽略: {name} (先运行 clash-sub update {name}){Colors.NC}")
+            else:
+                sources.append((name, config_file))
+        if not sources:
+            print(f"{Colors.RED}✗ 没有可合并的订阅{Colors.NC}")
+            return False
+
+        output_path = Path(output).expanduser()
+        started = time.monotonic()
+        try:
+            result = merge_files(sources, output_path)
+        except (OSError, ValueError, yaml.YAMLError) as exc:
+            print(f"{Colors.RED}✗ 合并失败: {exc}{Colors.NC}")
+            return False
+
+        print(f"{Colors.GREEN}✓ 已合并 {len(result.sources)} 个订阅: {', '.join(result.sources)}{Colors.NC}")
+        print(f"   节点: {result.seen} 个 -> {Colors.GREEN}{result.kept}{Colors.NC} 个 (去重 {result.duplicates}，重命名 {result.renamed})")
+        if result.invalid:
+            print(f"   {Colors.YELLOW}忽略缺少 type/server/name 的节点 {result.invalid} 个{Colors.NC}")
+        if result.dropped_providers:
+            print(
+                f"   {Colors.YELLOW}⚠ 未合并 proxy-providers (仅合并内联节点): "
+                f"{', '.join(result.dropped_providers)}{Colors.NC}"
+            )
+        print(f"   输出: {output_path} ({time.monotonic() - started:.1f}s)")
+        return True
+
     def restart_clash(self, skip_check: bool = False) -> bool:
         """Send HUP to Clash binaries to reload config."""
         if not skip_check and not self.check_clash_config():
@@ -387,19 +923,16 @@ class ClashSubscriptionManager:
 
     def import_subscriptions_from_party(self, overwrite: bool = False, prefix: str = "") -> bool:
         """Import subscriptions listed in Clash Party profile.yaml."""
-        profile_yaml = self.clash_party_dir / "profile.yaml"
-        if not profile_yaml.exists():
-            print(f"{Colors.RED}✗ 未找到 Clash Party 配置文件: {profile_yaml}{Colors.NC}")
+        if not self.party_index.exists():
+            print(f"{Colors.RED}✗ 未找到 Clash Party 配置文件: {self.party_index.path}{Colors.NC}")
             return False
 
         try:
-            with open(profile_yaml, "r", encoding="utf-8") as handle:
-                profile_data = yaml.safe_load(handle) or {}
+            items = self.party_index.items()
         except yaml.YAMLError as exc:
             print(f"{Colors.RED}✗ 解析 Clash Party 配置失败: {exc}{Colors.NC}")
             return False
 
-        items = profile_data.get("items", [])
         if not items:
             print(f"{Colors.YELLOW}⚠ Clash Party 配置中没有订阅项{Colors.NC}")
             return False
@@ -461,6 +994,7 @@ class ClashSubscriptionManager:
 
         del subscriptions[name]
         self.save_config()
+        self.metadata.remove(name)
         print(f"{Colors.GREEN}✓ 订阅已删除: {name}{Colors.NC}")
 
     def toggle_subscription(self, name: str) -> None:
@@ -475,3 +1009,141 @@ class ClashSubscriptionManager:
         self.save_config()
         status = "启用" if sub["enabled"] else "禁用"
         print(f"{Colors.GREEN}✓ 订阅已{status}: {name}{Colors.NC}")
+
+
+def conditional_headers(record: Dict) -> Dict[str, str]:
+    """Build If-None-Match / If-Modified-Since headers from stored validators."""
+    headers = {}
+    if record.get("etag"):
+        headers["If-None-Match"] = record["etag"]
+    if record.get("last_modified"):
+        headers["If-Modified-Since"] = record["last_modified"]
+    return headers
+
+
+def provider_hints(headers) -> Dict:
+    """Scheduling and quota hints a provider sends along with the subscription.
+
+    ``profile-update-interval`` is given in hours and stored in seconds;
+    ``subscription-userinfo`` is stored parsed as ``userinfo``.
+    """
+    hints: Dict = {}
+    interval = headers.get("profile-update-interval")
+    if interval:
+        try:
+            hours = float(interval)
+        except ValueError:
+            hours = 0
+        if hours > 0:
+            hints["update_interval"] = int(hours * 3600)
+    userinfo = parse_userinfo(headers.get("subscription-userinfo"))
+    if userinfo:
+        hints["userinfo"] = userinfo
+    return hints
+
+
+def parse_userinfo(value: Optional[str]) -> Optional[Dict[str, int]]:
+    """Parse ``upload=..; download=..; total=..; expire=..`` into ints."""
+    if not value:
+        return None
+    info: Dict[str, int] = {}
+    for part in value.split(";"):
+        key, _, raw = part.partition("=")
+        key = key.strip().lower()
+        if key not in ("upload", "download", "total", "expire"):
+            continue
+        try:
+            info[key] = int(float(raw.strip()))
+        except ValueError:
+            continue
+    return info or None
+
+
+def quota_state(userinfo: Optional[Dict[str, int]], now: Optional[float] = None) -> Optional[str]:
+    """``QUOTA_EXPIRED`` / ``QUOTA_EXHAUSTED`` from stored userinfo, else None."""
+    if not userinfo:
+        return None
+    now = time.time() if now is None else now
+    expire = userinfo.get("expire") or 0
+    if expire and expire <= now:
+        return QUOTA_EXPIRED
+    total = userinfo.get("total") or 0
+    if total and userinfo.get("upload", 0) + userinfo.get("download", 0) >= total:
+        return QUOTA_EXHAUSTED
+    return None
+
+
+def format_userinfo(userinfo: Optional[Dict[str, int]], now: Optional[float] = None) -> List[str]:
+    """Traffic and expiry lines for ``clash-sub list``."""
+    if not userinfo:
+        return []
+    now = time.time() if now is None else now
+    lines = []
+    used = userinfo.get("upload", 0) + userinfo.get("download", 0)
+    total = userinfo.get("total") or 0
+    if total:
+        remaining = max(0, total - used)
+        color = Colors.RED if remaining == 0 else Colors.YELLOW if remaining < total * 0.1 else Colors.GREEN
+        lines.append(
+            f"流量: 已用 {human_bytes(used)} / {human_bytes(total)} "
+            f"(剩余 {color}{human_bytes(remaining)}{Colors.NC}, {used / total:.0%})"
+        )
+    elif used:
+        lines.append(f"流量: 已用 {human_bytes(used)}")
+
+    expire = userinfo.get("expire") or 0
+    if expire:
+        days = (expire - now) / 86400
+        stamp = datetime.fromtimestamp(expire).strftime("%Y-%m-%d")
+        if days <= 0:
+            lines.append(f"到期: {Colors.RED}{stamp} (已过期){Colors.NC}")
+        else:
+            color = Colors.YELLOW if days < 7 else Colors.GREEN
+            lines.append(f"到期: {color}{stamp} (剩余 {days:.0f} 天){Colors.NC}")
+    return lines
+
+
+def human_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.2f} TB"
+
+
+def summarize_subscription(stream) -> Tuple[SubscriptionSummary, int]:
+    """Scan a subscription in constant memory; returns its summary and group count."""
+    groups = 0
+
+    def count_group(fields: Dict[str, str], members: List[str]) -> None:
+        nonlocal groups
+        groups += 1
+
+    summary = scan_subscription(stream, on_group=count_group)
+    return summary, groups
+
+
+def content_fields(summary: SubscriptionSummary, groups: int = 0) -> Dict:
+    """Index fields describing a subscription's content."""
+    return {"nodes": summary.proxy_count, "types": dict(summary.type_counts), "groups": groups}
+
+
+def _format_stamp(stamp: Optional[float]) -> str:
+    return datetime.fromtimestamp(stamp).strftime("%m-%d %H:%M") if stamp else "-"
+
+
+def file_sha256(path: Path) -> str:
+    """Hash a file in chunks without loading it whole."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def format_type_counts(type_counts: Dict[str, int]) -> str:
+    """Render a protocol histogram such as ``(ss 12, vmess 3)``."""
+    if not type_counts:
+        return ""
+    parts = sorted(type_counts.items(), key=lambda item: (-item[1], item[0]))
+    return "(" + ", ".join(f"{kind} {count}" for kind, count in parts) + ")"
@@ -0,0 +1,243 @@
+"""Download-speed tests through the core's mixed port, one worker per test group."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from .console import Colors
+from .proxy_selector import ClashProxySelector, ProgressLine
+
+DEFAULT_SPEED_GROUP = "SpeedTest"
+DEFAULT_SPEED_URL = "https://speed.cloudflare.com/__down?bytes=10000000"
+DEFAULT_SPEED_TIMEOUT = 20.0
+DEFAULT_SPEED_LIMIT = 5
+DEFAULT_MAX_MB = 25
+CHUNK_SIZE = 64 * 1024
+# Floor for the transfer window, so a tiny payload cannot report an absurd rate.
+MIN_TRANSFER_SECONDS = 0.001
+
+
+class SpeedLane:
+    """A Selector group dedicated to speed tests and the payload routed through it.
+
+    The core must send the payload host through ``group`` (e.g. a
+    ``DOMAIN,speed.cloudflare.com,SpeedTest`` rule); lanes therefore need
+    distinct payload hosts to run in parallel.
+    """
+
+    __slots__ = ("group", "url")
+
+    def __init__(self, group: str, url: str):
+        self.group = group
+        self.url = url
+
+
+class SpeedResult:
+    __slots__ = ("name", "group", "size", "ttfb_ms", "seconds", "error")
+
+    def __init__(self, name: str, group: str):
+        self.name = name
+        self.group = group
+        self.size = 0
+        self.ttfb_ms = 0
+        self.seconds = 0.0
+        self.error: Optional[str] = None
+
+    @property
+    def mbps(self) -> float:
+        if self.error or self.seconds <= 0:
+            return 0.0
+        return self.size * 8 / self.seconds / 1_000_000
+
+
+def lanes_from_config(speed_cfg: Dict, group: Optional[str] = None, url: Optional[str] = None) -> List[SpeedLane]:
+    """Lanes from the ``speed`` config section; ``group``/``url`` override the first one."""
+    lanes_cfg = speed_cfg.get("lanes") or [
+        {"group": speed_cfg.get("group", DEFAULT_SPEED_GROUP), "url": speed_cfg.get("url", DEFAULT_SPEED_URL)}
+    ]
+    lanes = [SpeedLane(item.get("group", DEFAULT_SPEED_GROUP), item.get("url", DEFAULT_SPEED_URL)) for item in lanes_cfg]
+    if group or url:
+        first = lanes[0]
+        lanes = [SpeedLane(group or first.group, url or first.url)]
+    return lanes
+
+
+class SpeedTester:
+    """Switch each lane's group to a node, then time a download through the proxy.
+
+    Every lane runs in its own worker, so concurrency equals the number of
+    lanes: two downloads through one group would measure the same node.
+    """
+
+    def __init__(
+        self,
+        selector: ClashProxySelector,
+        proxy_url: str,
+        lanes: List[SpeedLane],
+        timeout: float = DEFAULT_SPEED_TIMEOUT,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+    ):
+        self.selector = selector
+        self.proxy_url = proxy_url
+        self.lanes = lanes
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+
+    def lane_members(self) -> Dict[str, List[str]]:
+        snap = self.selector.snapshot()
+        return {lane.group: snap.members(lane.group) for lane in self.lanes}
+
+    def select_targets(self, queries: List[str], limit: int) -> List[str]:
+        """Resolve node names or fuzzy queries against the lanes' groups.
+
+        Without queries, the best ``limit`` nodes by latency history are used.
+        """
+        members: List[str] = []
+        for names in self.lane_members().values():
+            members.extend(name for name in names if name not in members)
+
+        if not queries:
+            if self.selector.latency is not None:
+                members = self.selector.latency.probe_order(members)
+            return members[:limit]
+
+        index = self.selector.search_index()
+        targets: List[str] = []
+        for query in queries:
+            if query in members:
+                found = [query]
+            else:
+                matches = index.search(query, within=set(members))
+                found = [match.name for match in matches if match.score == matches[0].score]
+            targets.extend(name for name in found if name not in targets)
+        return targets[:limit]
+
+    def download(self, url: str) -> Tuple[int, int, float]:
+        """Fetch ``url`` through the proxy; returns (bytes, TTFB ms, transfer seconds).
+
+        TTFB is the time until the response headers arrived; the transfer
+        time runs from then until the last byte, so every counted byte is
+        inside the measured window.
+        """
+        # A fresh connection per test: a pooled keep-alive connection to the
+        # mixed port would stay pinned to the previously selected node.
+        with requests.Session() as session:
+            started = time.perf_counter()
+            response = session.get(
+                url,
+                proxies={"http": self.proxy_url, "https": self.proxy_url},
+                headers={"Connection": "close", "Cache-Control": "no-cache"},
+                stream=True,
+                timeout=(5, self.timeout),
+            )
+            with response:
+                response.raise_for_status()
+                ttfb = response.elapsed.total_seconds()
+                body_started = started + ttfb
+                size = 0
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    size += len(chunk)
+                    if size >= self.max_bytes or time.perf_counter() - started >= self.timeout:
+                        break
+                finished = time.perf_counter()
+        if size == 0:
+            raise ValueError("未收到任何数据")
+        return size, int(ttfb * 1000), max(finished - body_started, MIN_TRANSFER_SECONDS)
+
+    def measure(self, lane: SpeedLane, name: str) -> SpeedResult:
+        result = SpeedResult(name, lane.group)
+        try:
+            self.selector.put_selection(lane.group, name)
+            result.size, result.ttfb_ms, result.seconds = self.download(lane.url)
+        except (requests.exceptions.RequestException, ValueError) as exc:
+            result.error = str(exc)
+        return result
+
+    def run_all(
+        self,
+        names: List[str],
+        on_result: Optional[Callable[[SpeedResult], None]] = None,
+    ) -> List[SpeedResult]:
+        """Measure ``names`` with one worker per lane; each takes nodes its group contains."""
+        members = {group: set(lane_names) for group, lane_names in self.lane_members().items()}
+        pending = list(names)
+        results: List[SpeedResult] = []
+        lock = threading.Lock()
+
+        def take(lane: SpeedLane) -> Optional[str]:
+            with lock:
+                for position, name in enumerate(pending):
+                    if name in members[lane.group]:
+                        return pending.pop(position)
+            return None
+
+        def worker(lane: SpeedLane) -> None:
+            while True:
+                name = take(lane)
+                if name is None:
+                    return
+                result = self.measure(lane, name)
+                with lock:
+                    results.append(result)
+                    if on_result is not None:
+                        on_result(result)
+
+        threads = [threading.Thread(target=worker, args=(lane,), daemon=True) for lane in self.lanes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        latency = self.selector.latency
+        if latency is not None:
+            for result in results:
+                latency.record_speed(result.name, result.mbps, result.ttfb_ms)
+            latency.save()
+        return results
+
+    def run(self, queries: List[str], limit: int = DEFAULT_SPEED_LIMIT) -> bool:
+        """Resolve targets, test them and print a ranking by Mbps."""
+        missing = [lane.group for lane in self.lanes if lane.group not in self.selector.snapshot().groups]
+        if missing:
+            print(f"{Colors.RED}✗ 测速策略组不存在: {', '.join(missing)}{Colors.NC}")
+            print(f"{Colors.YELLOW}  提示: 在 Clash 配置中添加 Selector 组并将测速地址的域名路由到该组{Colors.NC}")
+            return False
+
+        targets = self.select_targets(queries, limit)
+        if not targets:
+            print(f"{Colors.YELLOW}没有可测速的节点{Colors.NC}")
+            return False
+
+        print(f"\n{Colors.CYAN}{'='*70}{Colors.NC}")
+        print(
+            f"{Colors.CYAN}下载测速: {len(targets)} 个节点 · "
+            f"{len(self.lanes)} 个测速组 · 代理 {self.proxy_url}{Colors.NC}"
+        )
+        print(f"{Colors.CYAN}{'='*70}{Colors.NC}\n")
+
+        progress = ProgressLine(len(targets))
+        results = self.run_all(targets, on_result=lambda item: progress.update(item.name, item.size))
+        progress.finish()
+
+        results.sort(key=lambda item: -item.mbps)
+        print(f"{'':5s}{'节点':40s} {'速度':>12s} {'首字节':>8s} {'下载量':>9s}")
+        for idx, result in enumerate(results, 1):
+            if result.error:
+                print(f"{idx:3d}. {Colors.BLUE}{result.name:40s}{Colors.NC} {Colors.RED}失败: {result.error}{Colors.NC}")
+                continue
+            print(
+                f"{idx:3d}. {Colors.BLUE}{result.name:40s}{Colors.NC} {human_speed(result.mbps)} "
+                f"{result.ttfb_ms:>6d}ms {result.size / 1024 / 1024:>7.1f}MB"
+            )
+        return any(not result.error for result in results)
+
+
+def human_speed(mbps: float) -> str:
+    color = Colors.GREEN if mbps >= 50 else Colors.YELLOW if mbps >= 10 else Colors.RED
+    return f"{color}{mbps:>7.1f} Mbps{Colors.NC}"
@@ -0,0 +1,150 @@
+"""YAML helpers that prefer the libyaml C bindings when available."""
+
+from __future__ import annotations
+
+from collections import Counter
+from typing import IO, Any, Callable, Dict, List, Optional, Union
+
+import yaml
+
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+HAS_LIBYAML = SafeLoader is not yaml.SafeLoader
+
+
+def load_yaml(stream: Union[str, bytes, IO]) -> Any:
+    """``yaml.safe_load`` using the fastest available safe loader."""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def dump_yaml(data: Any, stream: IO) -> None:
+    """Write ``data`` as block-style, unicode-preserving YAML."""
+    yaml.dump(data, stream, Dumper=SafeDumper, allow_unicode=True, default_flow_style=False)
+
+
+class SubscriptionSummary:
+    """What ``scan_subscription`` learned about a subscription document."""
+
+    def __init__(self) -> None:
+        self.is_mapping = False
+        self.keys: List[str] = []
+        self.proxy_count = 0
+        self.type_counts: Counter = Counter()
+
+    @property
+    def has_proxies(self) -> bool:
+        return "proxies" in self.keys or "proxy-providers" in self.keys
+
+    def validate(self) -> None:
+        """Raise ``ValueError`` if this does not look like a Clash config."""
+        if not self.is_mapping:
+            raise ValueError("不是有效的 YAML 对象")
+        if not self.has_proxies:
+            raise ValueError("缺少 proxies 或 proxy-providers 字段")
+
+
+# Scalar fields kept per node / group; everything else is skipped.
+NODE_FIELDS = frozenset(("name", "type", "server", "port", "udp"))
+GROUP_FIELDS = frozenset(("name", "type"))
+
+
+class _Frame:
+    __slots__ = ("mapping", "role", "expect_key", "key", "fields", "members")
+
+    def __init__(self, mapping: bool, role: str) -> None:
+        self.mapping = mapping
+        self.role = role
+        self.expect_key = mapping
+        self.key: Optional[str] = None
+        self.fields: Dict[str, str] = {}
+        self.members: List[str] = []
+
+
+def scan_subscription(
+    stream: Union[str, bytes, IO],
+    on_node: Optional[Callable[[Dict[str, str]], None]] = None,
+    on_group: Optional[Callable[[Dict[str, str], List[str]], None]] = None,
+) -> SubscriptionSummary:
+    """Walk parser events of the first document without building it.
+
+    Memory stays bounded by nesting depth rather than document size. Only
+    top-level keys, the ``proxies`` entry count and the node type
+    histogram are collected; ``on_node`` receives each node's scalar
+    ``NODE_FIELDS`` and ``on_group`` each proxy group's fields and members.
+    """
+    summary = SubscriptionSummary()
+    frames: List[_Frame] = []
+
+    for event in yaml.parse(stream, Loader=SafeLoader):
+        if isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            frame = frames.pop()
+            if frame.role == "node":
+                summary.type_counts[frame.fields.get("type") or "unknown"] += 1
+                if on_node is not None:
+                    on_node(frame.fields)
+            elif frame.role == "group" and on_group is not None:
+                on_group(frame.fields, frame.members)
+            if not frames:
+                break
+            continue
+
+        if not isinstance(event, yaml.NodeEvent):
+            continue
+
+        starts_mapping = isinstance(event, yaml.MappingStartEvent)
+        starts_sequence = isinstance(event, yaml.SequenceStartEvent)
+        starts_collection = starts_mapping or starts_sequence
+        parent = frames[-1] if frames else None
+
+        if parent is None:
+            summary.is_mapping = starts_mapping
+            if not starts_mapping:
+                break
+            frames.append(_Frame(True, "root"))
+            continue
+
+        if parent.mapping and parent.expect_key:
+            parent.expect_key = False
+            parent.key = event.value if isinstance(event, yaml.ScalarEvent) else None
+            if parent.role == "root" and parent.key is not None:
+                summary.keys.append(parent.key)
+            if starts_collection:
+                frames.append(_Frame(starts_mapping, "other"))
+            continue
+
+        if parent.mapping:
+            parent.expect_key = True
+
+        role = "other"
+        is_scalar = isinstance(event, yaml.ScalarEvent)
+        if parent.role == "root":
+            if parent.key == "proxies" and starts_sequence:
+                role = "proxies"
+            elif parent.key == "proxy-groups" and starts_sequence:
+                role = "groups"
+        elif parent.role == "proxies":
+            summary.proxy_count += 1
+            role = "node" if starts_mapping else "other"
+            if not starts_mapping:
+                summary.type_counts["unknown"] += 1
+        elif parent.role == "groups":
+            role = "group" if starts_mapping else "other"
+        elif parent.role == "node" and is_scalar:
+            if parent.key in NODE_FIELDS:
+                parent.fields[parent.key] = event.value
+        elif parent.role == "group":
+            if is_scalar and parent.key in GROUP_FIELDS:
+                parent.fields[parent.key] = event.value
+            elif starts_sequence and parent.key == "proxies":
+                role = "members"
+        elif parent.role == "members" and is_scalar:
+            parent.members.append(event.value)
+
+        if starts_collection:
+            frame = _Frame(starts_mapping, role)
+            if role == "members":
+                # Members are collected straight into the owning group.
+                frame.members = parent.members
+            frames.append(frame)
+
+    return summary